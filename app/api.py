@@ -1,23 +1,48 @@
-from fastapi import FastAPI, Query, Request, Body, Header, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Query, Request, Body, Header, HTTPException, BackgroundTasks
+from fastapi.responses import JSONResponse, PlainTextResponse, FileResponse, RedirectResponse, Response
+from starlette.middleware.gzip import GZipMiddleware
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-import sqlite3, json
+import sqlite3, json, hashlib
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
 from urllib.parse import urlsplit
 from collections import defaultdict
 
-from app.db import init_db, last_run
+from app import db
+from app.db import init_db, last_run, slow_domains, expensive_articles, llm_outcomes, generation
 from app.config import settings
 from app.ranker import pick_home_items
-from app.util import load_lines
-from app.pipeline import run_once
+from app import registry, metrics, images, retention
+from app.pipeline import run_once, RUN_LOCK
+from app import scheduler
+from contextlib import asynccontextmanager
 from app.settings import load_settings
 
-import time
+import os, time
 _last_refresh_ts = 0
 
-app = FastAPI(title="Summarizer API")
+# part of every ETag: a deploy/restart (new templates or code) must not keep answering 304
+STARTED_AT = time.time()
+BUILD_ID = os.getenv("BUILD_ID") or str(int(STARTED_AT))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if scheduler.ENABLED:
+        scheduler.start()
+    yield
+    scheduler.stop()
+
+app = FastAPI(title="Summarizer API", lifespan=lifespan)
+
+# compress JSON/HTML; brotli when the optional brotli-asgi package is installed (gzip fallback built in)
+try:
+    from brotli_asgi import BrotliMiddleware
+    # thumbnails and static images are already compressed; don't re-encode them on every request
+    app.add_middleware(BrotliMiddleware, minimum_size=500,
+                       excluded_handlers=[r"^/img/", r"^/static/.*\.(jpg|jpeg|png|webp|ico)$"])
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=500)
 
 ROOT = Path(__file__).resolve().parents[1]
 TEMPLATES_DIR = ROOT / "templates"
@@ -25,6 +50,46 @@ STATIC_DIR = ROOT / "static"
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
+@app.middleware("http")
+async def _time_requests(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    handler = getattr(route, "path", None) or ("/static" if request.url.path.startswith("/static/") else "other")
+    metrics.observe("summ_http_request_seconds", time.perf_counter() - t0,
+                    handler=handler, method=request.method, status=str(response.status_code))
+    return response
+
+def _validators(request: Request, private: bool = False) -> dict[str, str]:
+    """
+    ETag/Last-Modified/Cache-Control for a read endpoint. Content only changes when
+    ingest bumps the data generation, settings.json changes or a new build starts,
+    so the tag is derived from those plus the request's path and query.
+    """
+    gen, updated_at = generation()
+    stamps = registry.version("settings")
+    settings_mtime = stamps[0][0] / 1e9 if stamps and stamps[0] else 0.0
+    key = f"{BUILD_ID}|{gen}|{stamps}|{request.url.path}?{request.url.query}"
+    return {
+        "ETag": 'W/"%s"' % hashlib.sha1(key.encode()).hexdigest()[:20],
+        "Last-Modified": formatdate(max(updated_at, settings_mtime, STARTED_AT), usegmt=True),
+        "Cache-Control": ("private" if private else "public") + ", max-age=0, must-revalidate",
+    }
+
+def _not_modified(request: Request, headers: dict[str, str]) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        # weak comparison; If-Modified-Since is ignored when If-None-Match is present
+        tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+        return "*" in tags or headers["ETag"].removeprefix("W/") in tags
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return parsedate_to_datetime(headers["Last-Modified"]) <= parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+    return False
+
 def _prettify_domain(host: str) -> str:
     if not host:
         return ""
@@ -49,10 +114,11 @@ def build_source_map() -> dict[str, str]:
     Falls back to a prettified domain.
     """
     init_db()
-    conn = sqlite3.connect(settings.db_path); cur = conn.cursor()
-    cur.execute("SELECT json_extract(summary_json,'$.source'), json_extract(summary_json,'$.domain') FROM summaries")
-    rows = cur.fetchall()
-    conn.close()
+    with metrics.timer("summ_db_seconds", op="source_map"):
+        conn = sqlite3.connect(settings.db_path); cur = conn.cursor()
+        cur.execute("SELECT json_extract(summary_json,'$.source'), json_extract(summary_json,'$.domain') FROM summaries")
+        rows = cur.fetchall()
+        conn.close()
 
     by_domain_counts: dict[str, defaultdict[str, int]] = {}
     for src, dom in rows:
@@ -77,18 +143,21 @@ def build_source_map() -> dict[str, str]:
 def list_sources() -> list[str]:
     init_db()
     # prefer distinct sources from cached items
-    conn = sqlite3.connect(settings.db_path); cur = conn.cursor()
-    cur.execute("SELECT DISTINCT json_extract(summary_json,'$.source') FROM summaries WHERE json_extract(summary_json,'$.source') IS NOT NULL")
-    rows = [r[0] for r in cur.fetchall() if r and r[0]]
-    conn.close()
+    with metrics.timer("summ_db_seconds", op="list_sources"):
+        conn = sqlite3.connect(settings.db_path); cur = conn.cursor()
+        cur.execute("SELECT DISTINCT json_extract(summary_json,'$.source') FROM summaries WHERE json_extract(summary_json,'$.source') IS NOT NULL")
+        rows = [r[0] for r in cur.fetchall() if r and r[0]]
+        conn.close()
     if rows:
         return sorted(set(rows))
     # fallback: derive domains from feeds.txt
-    feeds = load_lines(str(ROOT / "data" / "feeds.txt"))
+    feeds = registry.feeds()
     doms = sorted({urlsplit(u).netloc for u in feeds if u})
     return doms
 
-def get_rows(limit: int, offset: int, q: str | None, since: str | None, source: str | None = None):
+def get_rows(limit: int, offset: int, q: str | None, since: str | None, source: str | None = None,
+             archive: bool = False):
+    """Newest-first summaries; with archive=True rows moved to the archive DB are included."""
     init_db()
     where = []
     params: list = []
@@ -117,17 +186,21 @@ def get_rows(limit: int, offset: int, q: str | None, since: str | None, source:
             params.append(source)
 
     where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    table = ("(SELECT summary_json, created_at FROM main.summaries "
+             "UNION ALL SELECT summary_json, created_at FROM archive.summaries)") if archive else "summaries"
     sql = (
-        "SELECT summary_json FROM summaries "
+        f"SELECT summary_json FROM {table} "
         f"{where_sql} "
         "ORDER BY created_at DESC LIMIT ? OFFSET ?"
     )
     params.extend([limit, offset])
 
-    conn = sqlite3.connect(settings.db_path); cur = conn.cursor()
-    cur.execute(sql, params)
-    rows = [json.loads(r[0]) for r in cur.fetchall()]
-    conn.close()
+    with metrics.timer("summ_db_seconds", op="get_rows_archive" if archive else "get_rows"):
+        conn = db.connect(archive=True) if archive else sqlite3.connect(settings.db_path)
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = [json.loads(r[0]) for r in cur.fetchall()]
+        conn.close()
 
     # ensure display date for legacy rows
     from datetime import datetime
@@ -151,30 +224,67 @@ def get_candidates(limit: int = 200, q: str | None = None, source: str | None =
 # Hidden utility endpoint; optional bearer guard
 @app.get("/items", include_in_schema=False)
 def list_items(
+    request: Request,
     limit: int = Query(30, ge=1, le=200),
     offset: int = Query(0, ge=0),
     q: str | None = None,
     since: str | None = None,
     authorization: str | None = Header(None),
-    source: str | None = None
+    source: str | None = None,
+    archive: bool = False,
 ):
     required = f"Bearer {settings.refresh_token}" if settings.refresh_token else None
     if required and authorization != required:
         raise HTTPException(status_code=401, detail="unauthorized")
-    return JSONResponse(get_rows(limit, offset, q, since, source))
+    headers = _validators(request, private=True)
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(get_rows(limit, offset, q, since, source, archive), headers=headers)
+
+# Hidden ingest cost report; same bearer guard as /items
+@app.get("/report", include_in_schema=False)
+def report_api(
+    runs: int = Query(10, ge=1, le=500),
+    limit: int = Query(20, ge=1, le=200),
+    authorization: str | None = Header(None),
+):
+    required = f"Bearer {settings.refresh_token}" if settings.refresh_token else None
+    if required and authorization != required:
+        raise HTTPException(status_code=401, detail="unauthorized")
+    init_db()
+    return JSONResponse({
+        "runs": runs,
+        "slow_domains": slow_domains(runs, limit),
+        "expensive_articles": expensive_articles(runs, limit),
+        "llm_outcomes": llm_outcomes(runs),
+    })
 
 @app.get("/health")
 def health():
     lr = last_run()
     return {"status": "ok", "last_run": lr}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics_api():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # at top of file
 import time
 _last_refresh_ts = 0          # keep this global
 
 
+def _maintain() -> None:
+    """retention.maybe_run() after a manual refresh; skipped if an ingest run holds the lock."""
+    if RUN_LOCK.acquire(blocking=False):
+        try:
+            retention.maybe_run()
+        finally:
+            RUN_LOCK.release()
+
+
 @app.post("/refresh")
 def refresh(
+    background: BackgroundTasks,
     per_feed: int | None = Body(None, embed=True),
     authorization: str | None = Header(None),
     # optionally accept token in body as a fallback if proxy strips headers
@@ -200,30 +310,40 @@ def refresh(
     # 3) ... proceed normally
     s = load_settings()
     per_feed = per_feed or s.per_feed_cap
-    feeds = load_lines(str(ROOT / "data" / "feeds.txt"))
+    feeds = registry.feeds()
     if not feeds:
         return JSONResponse({"error": "no feeds configured"}, status_code=400)
-    stats = run_once(feeds=feeds, per_feed=per_feed, dry_run=False)
+    with RUN_LOCK:  # don't overlap with a scheduled poll
+        stats = run_once(feeds=feeds, per_feed=per_feed, dry_run=False)
+    # archiving/VACUUM can take a while: run it after the response is sent
+    background.add_task(_maintain)
     return JSONResponse({"ok": True, "stats": stats})
 
 
 @app.get("/home")
-def home_api(limit: int = Query(5, ge=1, le=50),
+def home_api(request: Request,
+             limit: int = Query(5, ge=1, le=50),
              offset: int = Query(0, ge=0),
              q: str | None = None,
              source: str | None = None):
     s = load_settings()
+    headers = _validators(request)
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
     pool = get_candidates(limit=200, q=q, source=source)
     top = pick_home_items(pool, home_count=offset+limit,
                           per_domain_quota=s.per_domain_quota,
                           half_life_hours=s.recency_half_life_hours)
     page = top[offset:offset+limit]
-    return JSONResponse(page)
+    return JSONResponse(page, headers=headers)
 
 # Single HTML route that supports search via ?q=
 @app.get("/", include_in_schema=False)
 def home_page(request: Request, q: str | None = None, source: str | None = None):
     s = load_settings()
+    headers = _validators(request)
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
     pool = get_candidates(limit=200, q=q, source=source)
     initial = pick_home_items(
         pool,
@@ -234,11 +354,27 @@ def home_page(request: Request, q: str | None = None, source: str | None = None)
     return templates.TemplateResponse(
         "index.html",
         {"request": request, "items": initial, "q": q or ""},
+        headers=headers,
     )
 
+# Local article thumbnails; names are content hashes, so they never change
+@app.get("/img/{name}", include_in_schema=False)
+def image(name: str):
+    path = images.lookup(name)
+    if path is None:
+        # evicted or unknown: fall back to the placeholder, briefly cacheable
+        return RedirectResponse(images.PLACEHOLDER_IMAGE, status_code=302,
+                                headers={"Cache-Control": "public, max-age=300"})
+    media_type = "image/webp" if name.endswith(".webp") else "image/jpeg"
+    return FileResponse(path, media_type=media_type,
+                        headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
 @app.get("/sources")
-def sources_api():
+def sources_api(request: Request):
+    headers = _validators(request)
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
     mapping = build_source_map()  # builds from SQLite only
     names = sorted(set(mapping.values()), key=str.lower)
-    return JSONResponse({"sources": names})
+    return JSONResponse({"sources": names}, headers=headers)
 
@@ -0,0 +1,201 @@
+"""
+Resumable bulk ingest (scripts/ingest.py --backfill / --resume).
+
+A job first enumerates every feed into a persisted queue of (feed, entry)
+items, checkpointing after each feed. It then drains the queue in batches:
+each batch is processed by a thread pool and committed in one transaction,
+together with the job's counters and its runs row. Only one batch is in
+memory at a time. Summaries are committed per article as they are stored;
+a batch's traces, item statuses, job counters and runs row are then
+committed together in one transaction. A killed job resumes from the first
+uncommitted batch; entries that were already stored by then come back as
+"cached". Entries whose page fetch failed ("retry": network error, 429/5xx,
+open circuit) go back into the queue with exponential backoff, up to
+BACKFILL_RETRIES attempts; the job is not done while any of them are left.
+"""
+from __future__ import annotations
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from app import db, fetch, metrics, registry
+from app.logging import setup
+from app.pipeline import _process_entry, _stage_totals, _now_iso
+
+log = setup()
+
+CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "8"))
+BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "50"))
+RETRIES = int(os.getenv("BACKFILL_RETRIES", "4"))
+RETRY_BACKOFF_S = float(os.getenv("BACKFILL_RETRY_SECONDS", "30"))
+
+_COUNTERS = ("seen", "summarized", "cached", "skipped", "retry", "errors")
+
+
+def create_job(feeds: List[str], per_feed: int, dry_run: bool = False) -> int:
+    db.init_db()
+    now = _now_iso()
+    run_id = db.record_run({}, now, now)
+    conn = db.connect(); cur = conn.cursor()
+    cur.execute(
+        """INSERT INTO backfill_jobs(run_id, created_at, updated_at, status, per_feed, dry_run, feeds_json)
+           VALUES(?,?,?,?,?,?,?)""",
+        (run_id, now, now, "enumerating", per_feed, int(dry_run), json.dumps(feeds)),
+    )
+    job_id = cur.lastrowid
+    conn.commit(); conn.close()
+    log.info("backfill job %d created: %d feeds, per_feed=%d", job_id, len(feeds), per_feed)
+    return job_id
+
+
+def latest_unfinished() -> int | None:
+    db.init_db()
+    conn = db.connect(); cur = conn.cursor()
+    cur.execute("SELECT id FROM backfill_jobs WHERE status != 'done' ORDER BY id DESC LIMIT 1")
+    r = cur.fetchone(); conn.close()
+    return r[0] if r else None
+
+
+def _load_job(job_id: int) -> Dict[str, Any]:
+    conn = db.connect(); cur = conn.cursor()
+    cur.execute("SELECT * FROM backfill_jobs WHERE id=?", (job_id,))
+    r = cur.fetchone(); conn.close()
+    if not r:
+        raise SystemExit(f"No backfill job {job_id}")
+    job = dict(r)
+    job["feeds"] = json.loads(job.pop("feeds_json"))
+    job["stats"] = json.loads(job.pop("stats_json") or "{}")
+    return job
+
+
+def _enumerate(job: Dict[str, Any]) -> None:
+    """Queue every feed's entries; one transaction (checkpoint) per feed."""
+    for i in range(job["feeds_done"], len(job["feeds"])):
+        feed_url = job["feeds"][i]
+        entries = fetch.get_feed_entries(feed_url, limit=job["per_feed"])
+        conn = db.connect(); cur = conn.cursor()
+        with metrics.timer("summ_db_seconds", op="backfill_enqueue"):
+            cur.executemany(
+                "INSERT OR IGNORE INTO backfill_items(job_id, feed_url, url, entry_json) VALUES(?,?,?,?)",
+                [(job["id"], feed_url, e["url"], json.dumps(e, ensure_ascii=False)) for e in entries if e.get("url")],
+            )
+            cur.execute("UPDATE backfill_jobs SET feeds_done=?, updated_at=? WHERE id=?",
+                        (i + 1, _now_iso(), job["id"]))
+            conn.commit()
+        conn.close()
+        job["feeds_done"] = i + 1
+        log.info("backfill job %d: queued %d entries from %s (%d/%d feeds)",
+                 job["id"], len(entries), feed_url, i + 1, len(job["feeds"]))
+    conn = db.connect()
+    conn.execute("UPDATE backfill_jobs SET status='running' WHERE id=?", (job["id"],))
+    conn.commit(); conn.close()
+
+
+def _next_batch(job_id: int, size: int) -> tuple[List[Dict[str, Any]], float | None]:
+    """
+    Up to `size` pending items that are due, and (if none are) when the next
+    backed-off one will be; ([], None) once the queue is drained.
+    """
+    conn = db.connect(); cur = conn.cursor()
+    cur.execute(
+        "SELECT id, attempts, entry_json FROM backfill_items "
+        "WHERE job_id=? AND status='pending' AND not_before <= ? ORDER BY id LIMIT ?",
+        (job_id, time.time(), size),
+    )
+    rows = [{"item_id": r["id"], "attempts": r["attempts"], **json.loads(r["entry_json"])} for r in cur.fetchall()]
+    due = None
+    if not rows:
+        cur.execute("SELECT MIN(not_before) FROM backfill_items WHERE job_id=? AND status='pending'", (job_id,))
+        due = cur.fetchone()[0]
+    conn.close()
+    return rows, due
+
+
+def _checkpoint(job: Dict[str, Any], done: List[tuple], traces: List[Dict[str, Any]],
+                stats: Dict[str, Any], status: str) -> None:
+    """Persist a processed batch: traces, item statuses, job counters and runs row in one transaction."""
+    now = _now_iso()
+    conn = db.connect(); cur = conn.cursor()
+    with metrics.timer("summ_db_seconds", op="backfill_checkpoint"):
+        db._insert_traces(cur, job["run_id"], traces)
+        cur.executemany("UPDATE backfill_items SET status=?, outcome=?, attempts=?, not_before=? WHERE id=?", done)
+        cur.execute("UPDATE backfill_jobs SET stats_json=?, status=?, updated_at=? WHERE id=?",
+                    (json.dumps(stats), status, now, job["id"]))
+        db._update_run(cur, job["run_id"], stats, now)
+        conn.commit()
+    conn.close()
+
+
+def run_job(job_id: int, concurrency: int = CONCURRENCY, batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """Run (or resume) a backfill job to completion; returns its counters."""
+    db.init_db()
+    job = _load_job(job_id)
+    if job["status"] == "done":
+        return job["stats"]
+    if job["status"] == "enumerating":
+        _enumerate(job)
+
+    rules = registry.filter_rules()
+    stats = {k: int(job["stats"].get(k, 0)) for k in _COUNTERS}
+    stages = dict(job["stats"].get("stages") or {})
+    tokens_saved = int(job["stats"].get("tokens_saved", 0))
+    repaired = int(job["stats"].get("repaired", 0))
+    error_kinds = Counter(job["stats"].get("error_kinds") or {})
+    t_start = time.monotonic()
+    processed_here = 0
+
+    def work(e: Dict[str, Any]) -> tuple[Dict[str, Any], str, Dict[str, Any]]:
+        trace: Dict[str, Any] = {}
+        outcome = _process_entry(e, rules, bool(job["dry_run"]), trace, polite=False)
+        trace["outcome"] = outcome
+        return e, outcome, trace
+
+    # stage seconds of this job only; worker threads report into it via metrics.bind
+    with metrics.collect() as run, \
+            ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="backfill") as ex:
+        while True:
+            batch, due = _next_batch(job_id, batch_size)
+            if not batch:
+                if due is None:
+                    break
+                # only backed-off retries are left
+                time.sleep(max(0.0, due - time.time()))
+                continue
+            before = _stage_totals(run)
+            results = list(ex.map(metrics.bind(work), batch))
+            after = _stage_totals(run)
+            for k, v in after.items():
+                stages[k] = round(stages.get(k, 0.0) + v - before.get(k, 0.0), 3)
+
+            done = []
+            for e, outcome, trace in results:
+                tokens_saved += trace.get("tokens_saved", 0)
+                repaired += bool(trace.get("repair"))
+                attempts = e["attempts"] + 1
+                if outcome == "retry" and attempts < RETRIES:
+                    # back into the queue; counted once it has a final outcome
+                    done.append(("pending", outcome, attempts,
+                                 time.time() + RETRY_BACKOFF_S * 2 ** (attempts - 1), e["item_id"]))
+                    continue
+                if trace.get("error_kind"):
+                    error_kinds[trace["error_kind"]] += 1
+                stats["seen"] += 1
+                stats[outcome] += 1
+                done.append(("error" if outcome in ("errors", "retry") else "done", outcome, attempts, 0.0,
+                             e["item_id"]))
+            _checkpoint(job, done, [t for _, _, t in results],
+                        {**stats, "stages": stages, "tokens_saved": tokens_saved,
+                         "repaired": repaired, "error_kinds": dict(error_kinds)}, "running")
+
+            processed_here += len(batch)
+            rate = processed_here / max(1e-6, time.monotonic() - t_start)
+            log.info("backfill job %d: %d processed (%s), %.2f entries/s",
+                     job_id, stats["seen"], ", ".join(f"{k}={stats[k]}" for k in _COUNTERS[1:]), rate)
+
+    final = {**stats, "stages": stages, "tokens_saved": tokens_saved,
+             "repaired": repaired, "error_kinds": dict(error_kinds)}
+    _checkpoint(job, [], [], final, "done")
+    return final
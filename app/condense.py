@@ -0,0 +1,194 @@
+"""
+Token-budgeted LLM input for app.summarizer.
+
+prepare() drops boilerplate lines ("Subscribe to our newsletter", share/cookie
+prompts, ...) and repeated paragraphs, then, if the article is still over the
+budget, keeps the most informative sentences (lead bonus, document term
+frequency, numbers/names) in their original order. Sentences longer than the
+whole budget are cut to it, and text with no usable sentences falls back to
+its head, so non-empty input never yields an empty prompt. chunks() splits
+very long articles for map-reduce summarization.
+
+Tokens are counted with tiktoken (o200k_base). Its encoding file is downloaded
+on first use and cached (TIKTOKEN_CACHE_DIR); a host that cannot fetch it
+falls back to a ~4 chars/token estimate, which makes INPUT_TOKEN_BUDGET and
+the map-reduce thresholds approximate.
+"""
+from __future__ import annotations
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from app.logging import setup
+
+log = setup()
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_SENT_RE = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"'”’)\]]))\s+(?=[\"'“‘(\[]?[A-Z0-9])")
+_NORM_RE = re.compile(r"[\W_]+")
+_NUM_RE = re.compile(r"\d")
+_CAP_RE = re.compile(r"(?<!^)(?<![.!?]\s)\b[A-Z][a-z]+")
+
+# short lines matching these are site furniture, not article content
+_BOILERPLATE_RE = re.compile(
+    r"^(advertisement|sponsored|related( articles| stories)?:?|read (more|next|also)\b|"
+    r"(sign up|subscribe)\b|share (this|on)\b|follow us\b|click here\b|"
+    r"(image|photo|picture)( credit)?:|copyright\b|©|all rights reserved)"
+    r"|newsletter|cookies?\b|javascript|log ?in to\b|already a subscriber",
+    re.I,
+)
+_BOILERPLATE_MAX_CHARS = 200
+
+_STOPWORDS = frozenset("""
+a an and are as at be been but by for from had has have he her his i if in into is it its
+not of on or our she so than that the their them they this to was we were which who will
+with would you your said says also more about after all can could one new over up out
+""".split())
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:  # not installed, or the encoding file cannot be fetched
+        log.warning("tiktoken unavailable; token budgets are estimated at ~4 chars/token")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return max(len(text) // 4, len(_WORD_RE.findall(text)) * 3 // 4)
+
+
+def head(text: str, budget: int) -> str:
+    """Longest prefix of `text` within `budget` tokens, cut back to a word boundary if possible."""
+    if count_tokens(text) <= budget:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:  # binary search on the prefix length
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    out = text[:lo]
+    space = out.rfind(" ")
+    return out[:space] if space > lo // 2 else out
+
+
+def clean_paragraphs(text: str) -> List[str]:
+    """Paragraphs of `text` without boilerplate lines and exact (normalized) repeats."""
+    out: List[str] = []
+    seen = set()
+    for para in (text or "").split("\n"):
+        para = " ".join(para.split())
+        if not para:
+            continue
+        if len(para) <= _BOILERPLATE_MAX_CHARS and _BOILERPLATE_RE.search(para):
+            continue
+        key = _NORM_RE.sub(" ", para.lower()).strip()
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        out.append(para)
+    return out
+
+
+def _terms(sentence: str) -> List[str]:
+    return [w for w in _NORM_RE.sub(" ", sentence.lower()).split() if w not in _STOPWORDS and len(w) > 2]
+
+
+def select_sentences(paragraphs: List[str], budget: int) -> List[str]:
+    """
+    Keep the highest-scoring sentences that fit in `budget` tokens, returned
+    as paragraphs in their original order. A sentence over the whole budget
+    (e.g. text without punctuation) is cut to it so it can still be picked.
+    """
+    sents = []  # (paragraph index, sentence)
+    for pi, para in enumerate(paragraphs):
+        sents.extend((pi, head(s, budget - 1)) for s in _SENT_RE.split(para) if s.strip())
+    df = Counter(t for _, s in sents for t in set(_terms(s)))
+    n = len(sents)
+
+    scored = []
+    for i, (pi, s) in enumerate(sents):
+        terms = _terms(s)
+        if not terms:
+            continue
+        # terms that recur across the article are what it is about; hapaxes add little
+        score = sum(math.log1p(df[t] - 1) for t in terms) / math.sqrt(len(terms))
+        score *= 1.0 + 1.5 * (1 - i / n) ** 3          # lead sentences carry the story
+        score *= 1.0 + 0.2 * bool(_NUM_RE.search(s)) + 0.1 * min(3, len(_CAP_RE.findall(s)))
+        scored.append((score, i))
+
+    keep, used = set(), 0
+    for _, i in sorted(scored, reverse=True):
+        cost = count_tokens(sents[i][1]) + 1
+        if used + cost > budget:
+            continue
+        keep.add(i)
+        used += cost
+
+    out: Dict[int, List[str]] = {}
+    for i in sorted(keep):
+        pi, s = sents[i]
+        out.setdefault(pi, []).append(s)
+    return [" ".join(v) for _, v in sorted(out.items())]
+
+
+def prepare(text: str, budget: int) -> tuple[str, Dict[str, Any]]:
+    """
+    Article text for the prompt, at most ~`budget` tokens; only empty if `text` is.
+    Returns (text, info) with raw/sent token counts and what was done.
+    """
+    raw_tokens = count_tokens(text)
+    paras = clean_paragraphs(text)
+    cleaned = "\n".join(paras)
+    info: Dict[str, Any] = {"raw_tokens": raw_tokens, "clean_tokens": count_tokens(cleaned), "selected": False}
+    if info["clean_tokens"] > budget:
+        cleaned = "\n".join(select_sentences(paras, budget))
+        info["selected"] = True
+    if not cleaned.strip():
+        # everything looked like boilerplate or no sentence scored: send the head rather than nothing
+        cleaned = head(cleaned or "\n".join(" ".join(p.split()) for p in text.split("\n") if p.strip()), budget)
+    info["sent_tokens"] = count_tokens(cleaned)
+    return cleaned, info
+
+
+def _pieces(text: str, budget: int) -> List[str]:
+    out = []
+    while text:
+        piece = head(text, budget) or text[:1]
+        out.append(piece)
+        text = text[len(piece):].lstrip()
+    return out
+
+
+def chunks(text: str, chunk_tokens: int, max_chunks: int) -> List[str]:
+    """
+    Split cleaned text on paragraph boundaries into at most max_chunks pieces of
+    ~chunk_tokens; paragraphs bigger than a piece are split into sentences, and
+    sentences bigger than a piece into consecutive heads.
+    """
+    paras = clean_paragraphs(text)
+    total = sum(count_tokens(p) for p in paras)
+    size = max(chunk_tokens, math.ceil(total / max_chunks))
+    paras = [s for p in paras for s in (_SENT_RE.split(p) if count_tokens(p) > size else [p]) if s.strip()]
+    paras = [piece for p in paras for piece in _pieces(p, size)]
+    out: List[List[str]] = [[]]
+    used = 0
+    for p in paras:
+        t = count_tokens(p)
+        if out[-1] and used + t > size and len(out) < max_chunks:
+            out.append([])
+            used = 0
+        out[-1].append(p)
+        used += t
+    return ["\n".join(c) for c in out if c]
@@ -6,7 +6,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 ROOT = Path(__file__).resolve().parents[1]
-DATA_DIR = ROOT / "data"
+DATA_DIR = Path(os.getenv("DATA_DIR", str(ROOT / "data")))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 @dataclass(frozen=True)
@@ -15,8 +15,10 @@ class Settings:
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     request_timeout_s: int = int(os.getenv("REQUEST_TIMEOUT_SECONDS", "15"))
     input_char_cap: int = int(os.getenv("INPUT_CHAR_CAP", "12000"))
+    input_token_budget: int = int(os.getenv("INPUT_TOKEN_BUDGET", "3000"))
     max_output_tokens: int = int(os.getenv("MAX_OUTPUT_TOKENS", "220"))
-    db_path: Path = DATA_DIR / "cache.sqlite"
+    db_path: Path = Path(os.getenv("DB_PATH", str(DATA_DIR / "cache.sqlite")))
+    archive_db_path: Path = Path(os.getenv("ARCHIVE_DB_PATH", str(DATA_DIR / "archive.sqlite")))
     user_agent: str = os.getenv("USER_AGENT", "news-summarizer/0.1 (+https://example.local)")
     refresh_token: str = os.getenv("REFRESH_TOKEN", "")
 
@@ -1,29 +1,54 @@
-import sqlite3, json
+import sqlite3, json, time
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, Any, List
 from app.config import settings
+from app import metrics
 
 DB_PATH = settings.db_path
+ARCHIVE_PATH = settings.archive_db_path
+_archive_ready = False  # archive schema created by init_db() in this process
 
-def connect() -> sqlite3.Connection:
+def connect(archive: bool = False) -> sqlite3.Connection:
+    """Connection to the hot DB; with archive=True the archive file is attached as `archive`."""
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
+    if archive:
+        conn.execute("ATTACH DATABASE ? AS archive", (str(ARCHIVE_PATH),))
     return conn
 
+def _add_column(c: sqlite3.Cursor, table: str, column: str, decl: str) -> None:
+    """Lightweight migration: add a column to an existing table if it is missing."""
+    cols = {r[1] for r in c.execute(f"PRAGMA table_info({table})")}
+    if column not in cols:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+_SUMMARIES_DDL = """
+    CREATE TABLE IF NOT EXISTS {table}(
+        url TEXT PRIMARY KEY,
+        title TEXT,
+        published_at TEXT,
+        content_hash TEXT,
+        summary_json TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )
+"""
+
+@metrics.timed("summ_db_seconds", op="init_db")
 def init_db() -> None:
     conn = connect(); c = conn.cursor()
+    c.execute(_SUMMARIES_DDL.format(table="summaries"))
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hash ON summaries(content_hash)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_created ON summaries(created_at)")
+    # urls/hashes moved to the archive DB (see app.retention), so they are not summarized again
     c.execute("""
-        CREATE TABLE IF NOT EXISTS summaries(
+        CREATE TABLE IF NOT EXISTS archived_urls(
             url TEXT PRIMARY KEY,
-            title TEXT,
-            published_at TEXT,
             content_hash TEXT,
-            summary_json TEXT NOT NULL,
-            created_at TEXT NOT NULL
+            archived_at TEXT NOT NULL
         )
     """)
-    c.execute("CREATE INDEX IF NOT EXISTS idx_hash ON summaries(content_hash)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archived_hash ON archived_urls(content_hash)")
     # NEW: runs table
     c.execute("""
         CREATE TABLE IF NOT EXISTS runs(
@@ -37,14 +62,160 @@ def init_db() -> None:
             errors INTEGER NOT NULL
         )
     """)
+    # per-stage seconds for the run, JSON {stage: seconds}
+    _add_column(c, "runs", "stages_json", "TEXT")
+    # LLM input tokens saved over the run vs. sending each article cut at INPUT_CHAR_CAP (see summarizer)
+    _add_column(c, "runs", "tokens_saved", "INTEGER NOT NULL DEFAULT 0")
+    # failed articles per error class, JSON {kind: count}
+    _add_column(c, "runs", "error_kinds_json", "TEXT")
+    # articles whose page fetch failed (network error, 429/5xx, open circuit); retried on a later run
+    _add_column(c, "runs", "retry", "INTEGER NOT NULL DEFAULT 0")
+    # one row per article examined in a run (see pipeline.run_once)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS article_traces(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            domain TEXT,
+            outcome TEXT NOT NULL,
+            bytes_fetched INTEGER NOT NULL DEFAULT 0,
+            fetch_ms INTEGER NOT NULL DEFAULT 0,
+            extract_ms INTEGER NOT NULL DEFAULT 0,
+            llm_ms INTEGER NOT NULL DEFAULT 0,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            output_tokens INTEGER NOT NULL DEFAULT 0,
+            error TEXT
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_traces_run ON article_traces(run_id)")
+    _add_column(c, "article_traces", "tokens_saved", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(c, "article_traces", "error_kind", "TEXT")   # see pipeline._error_kind
+    _add_column(c, "article_traces", "repair", "TEXT")       # "local"/"llm" if the LLM output needed fixing
+    # per-feed polling state for app.scheduler (epoch seconds)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS feed_state(
+            feed_url TEXT PRIMARY KEY,
+            interval_s REAL NOT NULL DEFAULT 3600,
+            next_poll_at REAL NOT NULL DEFAULT 0,
+            last_polled_at REAL,
+            last_new_at REAL,
+            polls INTEGER NOT NULL DEFAULT 0,
+            new_items INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    # incremental fetch: newest processed entry + HTTP validators of the last feed download
+    _add_column(c, "feed_state", "last_guid", "TEXT")
+    _add_column(c, "feed_state", "last_published", "REAL")
+    _add_column(c, "feed_state", "etag", "TEXT")
+    _add_column(c, "feed_state", "last_modified", "TEXT")
+    # resumable backfill jobs and their (feed, entry) work queue (see app.backfill)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_jobs(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            status TEXT NOT NULL,
+            per_feed INTEGER NOT NULL,
+            dry_run INTEGER NOT NULL DEFAULT 0,
+            feeds_json TEXT NOT NULL,
+            feeds_done INTEGER NOT NULL DEFAULT 0,
+            stats_json TEXT NOT NULL DEFAULT '{}'
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_items(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER NOT NULL,
+            feed_url TEXT NOT NULL,
+            url TEXT NOT NULL,
+            entry_json TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            outcome TEXT,
+            UNIQUE(job_id, url)
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_backfill_pending ON backfill_items(job_id, status, id)")
+    # failed fetches ("retry") go back to pending until not_before, at most BACKFILL_RETRIES times
+    _add_column(c, "backfill_items", "attempts", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(c, "backfill_items", "not_before", "REAL NOT NULL DEFAULT 0")
+    # persisted robots.txt bodies / site names (see app.sitecache)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS site_cache(
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            ok INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_site_cache_fetched ON site_cache(fetched_at)")
+    # small key/value store; 'generation' is bumped on every change to summaries (HTTP validators)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS meta(
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    conn.commit(); conn.close()
+    global _archive_ready
+    if not _archive_ready:
+        # archive DB (see app.retention); once per process so connect(archive=True) is just an ATTACH
+        conn = connect(archive=True)
+        conn.execute(_SUMMARIES_DDL.format(table="archive.summaries"))
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_created ON summaries(created_at)")
+        conn.commit(); conn.close()
+        _archive_ready = True
+
+def _bump_generation(cur: sqlite3.Cursor) -> None:
+    """Advance the data generation inside the caller's transaction."""
+    cur.execute(
+        "INSERT INTO meta(key, value, updated_at) VALUES('generation', '1', ?) "
+        "ON CONFLICT(key) DO UPDATE SET value=CAST(value AS INTEGER)+1, updated_at=excluded.updated_at",
+        (time.time(),),
+    )
+
+@metrics.timed("summ_db_seconds", op="bump_generation")
+def bump_generation() -> None:
+    conn = connect(); cur = conn.cursor()
+    _bump_generation(cur)
+    conn.commit(); conn.close()
+
+@metrics.timed("summ_db_seconds", op="meta_get")
+def meta_get(key: str) -> str | None:
+    conn = connect(); cur = conn.cursor()
+    cur.execute("SELECT value FROM meta WHERE key=?", (key,))
+    r = cur.fetchone(); conn.close()
+    return r[0] if r else None
+
+@metrics.timed("summ_db_seconds", op="meta_set")
+def meta_set(key: str, value: str) -> None:
+    conn = connect()
+    conn.execute("INSERT OR REPLACE INTO meta(key, value, updated_at) VALUES(?,?,?)", (key, value, time.time()))
     conn.commit(); conn.close()
 
+@metrics.timed("summ_db_seconds", op="generation")
+def generation() -> tuple[int, float]:
+    """(generation, unix time of the last change) of the summaries data; (0, 0.0) before any write."""
+    conn = connect(); cur = conn.cursor()
+    try:
+        cur.execute("SELECT value, updated_at FROM meta WHERE key='generation'")
+        r = cur.fetchone()
+    except sqlite3.OperationalError:  # meta not created yet (init_db not run)
+        r = None
+    conn.close()
+    return (int(r[0]), float(r[1])) if r else (0, 0.0)
+
+@metrics.timed("summ_db_seconds", op="has_url")
 def has_url(url: str) -> bool:
     conn = connect(); cur = conn.cursor()
-    cur.execute("SELECT 1 FROM summaries WHERE url=?", (url,))
+    cur.execute("SELECT 1 FROM summaries WHERE url=? UNION ALL SELECT 1 FROM archived_urls WHERE url=? LIMIT 1",
+                (url, url))
     r = cur.fetchone(); conn.close()
     return bool(r)
 
+@metrics.timed("summ_db_seconds", op="insert_summary")
 def insert_summary(data: Dict[str, Any], content_hash: str, published_at: str = "") -> None:
     conn = connect(); cur = conn.cursor()
     cur.execute(
@@ -59,8 +230,10 @@ def insert_summary(data: Dict[str, Any], content_hash: str, published_at: str =
             datetime.now(timezone.utc).isoformat(),
         ),
     )
+    _bump_generation(cur)
     conn.commit(); conn.close()
 
+@metrics.timed("summ_db_seconds", op="recent")
 def recent(limit: int = 50) -> List[Dict[str, Any]]:
     conn = connect(); cur = conn.cursor()
     cur.execute("SELECT summary_json FROM summaries ORDER BY created_at DESC LIMIT ?", (limit,))
@@ -69,11 +242,13 @@ def recent(limit: int = 50) -> List[Dict[str, Any]]:
     return rows
 
 # NEW: record and fetch run stats
-def record_run(stats: Dict[str, int], started_at: str, finished_at: str) -> None:
+@metrics.timed("summ_db_seconds", op="record_run")
+def record_run(stats: Dict[str, Any], started_at: str, finished_at: str) -> int:
     conn = connect(); cur = conn.cursor()
     cur.execute(
-        """INSERT INTO runs(started_at, finished_at, seen, summarized, cached, skipped, errors)
-           VALUES(?,?,?,?,?,?,?)""",
+        """INSERT INTO runs(started_at, finished_at, seen, summarized, cached, skipped, errors, stages_json,
+                            tokens_saved, error_kinds_json, retry)
+           VALUES(?,?,?,?,?,?,?,?,?,?,?)""",
         (
             started_at, finished_at,
             int(stats.get("seen",0)),
@@ -81,15 +256,269 @@ def record_run(stats: Dict[str, int], started_at: str, finished_at: str) -> None
             int(stats.get("cached",0)),
             int(stats.get("skipped",0)),
             int(stats.get("errors",0)),
+            json.dumps(stats.get("stages") or {}),
+            int(stats.get("tokens_saved",0)),
+            json.dumps(stats.get("error_kinds") or {}),
+            int(stats.get("retry",0)),
         ),
     )
+    run_id = cur.lastrowid
     conn.commit(); conn.close()
+    return run_id
 
+@metrics.timed("summ_db_seconds", op="update_run")
+def update_run(run_id: int, stats: Dict[str, Any], finished_at: str) -> None:
+    """Checkpoint the counters of a long-running run (e.g. a backfill job)."""
+    conn = connect(); cur = conn.cursor()
+    _update_run(cur, run_id, stats, finished_at)
+    conn.commit(); conn.close()
+
+def _update_run(cur: sqlite3.Cursor, run_id: int, stats: Dict[str, Any], finished_at: str) -> None:
+    """update_run() inside the caller's transaction."""
+    cur.execute(
+        """UPDATE runs SET finished_at=?, seen=?, summarized=?, cached=?, skipped=?, errors=?, stages_json=?,
+                          tokens_saved=?, error_kinds_json=?, retry=?
+           WHERE id=?""",
+        (
+            finished_at,
+            int(stats.get("seen",0)),
+            int(stats.get("summarized",0)),
+            int(stats.get("cached",0)),
+            int(stats.get("skipped",0)),
+            int(stats.get("errors",0)),
+            json.dumps(stats.get("stages") or {}),
+            int(stats.get("tokens_saved",0)),
+            json.dumps(stats.get("error_kinds") or {}),
+            int(stats.get("retry",0)),
+            run_id,
+        ),
+    )
+
+@metrics.timed("summ_db_seconds", op="last_run")
 def last_run() -> Dict[str, Any] | None:
     conn = connect(); cur = conn.cursor()
-    cur.execute("SELECT started_at, finished_at, seen, summarized, cached, skipped, errors "
-                "FROM runs ORDER BY id DESC LIMIT 1")
+    cur.execute("SELECT started_at, finished_at, seen, summarized, cached, skipped, errors, tokens_saved, "
+                "retry, stages_json, error_kinds_json FROM runs ORDER BY id DESC LIMIT 1")
     r = cur.fetchone(); conn.close()
     if not r: return None
-    cols = ["started_at","finished_at","seen","summarized","cached","skipped","errors"]
-    return {k: r[i] for i,k in enumerate(cols)}
+    cols = ["started_at","finished_at","seen","summarized","cached","skipped","errors","tokens_saved","retry"]
+    out = {k: r[i] for i,k in enumerate(cols)}
+    out["stages"] = json.loads(r["stages_json"] or "{}")
+    out["error_kinds"] = json.loads(r["error_kinds_json"] or "{}")
+    return out
+
+TRACE_COLS = ["url", "domain", "outcome", "bytes_fetched", "fetch_ms", "extract_ms",
+              "llm_ms", "prompt_tokens", "output_tokens", "tokens_saved", "error", "error_kind", "repair"]
+_TRACE_TEXT = {"url", "domain", "outcome", "error", "error_kind", "repair"}
+
+@metrics.timed("summ_db_seconds", op="insert_traces")
+def insert_traces(run_id: int, traces: List[Dict[str, Any]]) -> None:
+    if not traces:
+        return
+    conn = connect(); cur = conn.cursor()
+    _insert_traces(cur, run_id, traces)
+    conn.commit(); conn.close()
+
+def _insert_traces(cur: sqlite3.Cursor, run_id: int, traces: List[Dict[str, Any]]) -> None:
+    """insert_traces() inside the caller's transaction."""
+    cur.executemany(
+        f"INSERT INTO article_traces(run_id, {', '.join(TRACE_COLS)}) "
+        f"VALUES(?, {', '.join('?' for _ in TRACE_COLS)})",
+        [(run_id, *[t.get(k, None if k in _TRACE_TEXT else 0) for k in TRACE_COLS]) for t in traces],
+    )
+
+_LAST_RUNS = "run_id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?)"
+
+@metrics.timed("summ_db_seconds", op="report")
+def slow_domains(last_runs: int = 10, limit: int = 20) -> List[Dict[str, Any]]:
+    """Domains ranked by mean fetch+extract+LLM time per fetched article over the last runs."""
+    conn = connect(); cur = conn.cursor()
+    cur.execute(
+        f"""SELECT domain,
+                   COUNT(*) AS articles,
+                   SUM(outcome = 'errors') AS errors,
+                   SUM(outcome = 'skipped') AS skipped,
+                   SUM(outcome = 'retry') AS retry,
+                   ROUND(AVG(fetch_ms)) AS avg_fetch_ms,
+                   ROUND(AVG(extract_ms)) AS avg_extract_ms,
+                   ROUND(AVG(llm_ms)) AS avg_llm_ms,
+                   ROUND(AVG(fetch_ms + extract_ms + llm_ms)) AS avg_total_ms,
+                   SUM(bytes_fetched) AS bytes_fetched,
+                   SUM(prompt_tokens) AS prompt_tokens,
+                   SUM(output_tokens) AS output_tokens,
+                   SUM(tokens_saved) AS tokens_saved
+            FROM article_traces
+            WHERE {_LAST_RUNS} AND outcome != 'cached'
+            GROUP BY domain
+            ORDER BY avg_total_ms DESC
+            LIMIT ?""",
+        (last_runs, limit),
+    )
+    rows = [dict(r) for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+@metrics.timed("summ_db_seconds", op="report")
+def expensive_articles(last_runs: int = 10, limit: int = 20) -> List[Dict[str, Any]]:
+    """Articles ranked by LLM tokens, then total time, over the last runs."""
+    conn = connect(); cur = conn.cursor()
+    cur.execute(
+        f"""SELECT run_id, url, domain, outcome, bytes_fetched, fetch_ms, extract_ms, llm_ms,
+                   prompt_tokens, output_tokens, tokens_saved
+            FROM article_traces
+            WHERE {_LAST_RUNS} AND outcome != 'cached'
+            ORDER BY prompt_tokens + output_tokens DESC, fetch_ms + extract_ms + llm_ms DESC
+            LIMIT ?""",
+        (last_runs, limit),
+    )
+    rows = [dict(r) for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+@metrics.timed("summ_db_seconds", op="report")
+def llm_outcomes(last_runs: int = 10) -> List[Dict[str, Any]]:
+    """
+    LLM token spend over the last runs, split into stored summaries (by repair
+    path) and failures (by error kind).
+    """
+    conn = connect(); cur = conn.cursor()
+    cur.execute(
+        f"""SELECT CASE WHEN outcome = 'summarized' THEN 'stored' || COALESCE(' (' || repair || ' repair)', '')
+                        ELSE 'failed: ' || COALESCE(error_kind, 'other') END AS result,
+                   COUNT(*) AS articles,
+                   SUM(prompt_tokens) AS prompt_tokens,
+                   SUM(output_tokens) AS output_tokens
+            FROM article_traces
+            WHERE {_LAST_RUNS} AND outcome IN ('summarized', 'errors')
+            GROUP BY result
+            ORDER BY articles DESC""",
+        (last_runs,),
+    )
+    rows = [dict(r) for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+@metrics.timed("summ_db_seconds", op="feed_states")
+def feed_states() -> Dict[str, Dict[str, Any]]:
+    conn = connect(); cur = conn.cursor()
+    cur.execute("SELECT * FROM feed_state")
+    rows = {r["feed_url"]: dict(r) for r in cur.fetchall()}
+    conn.close()
+    return rows
+
+FEED_STATE_COLS = ["interval_s", "next_poll_at", "last_polled_at", "last_new_at", "polls", "new_items",
+                   "last_guid", "last_published", "etag", "last_modified"]
+
+@metrics.timed("summ_db_seconds", op="save_feed_state")
+def save_feed_state(state: Dict[str, Any]) -> None:
+    """Upsert the given columns of one feed_state row (state must include feed_url)."""
+    conn = connect(); cur = conn.cursor()
+    cols = [k for k in FEED_STATE_COLS if k in state]
+    cur.execute(
+        f"INSERT INTO feed_state(feed_url, {', '.join(cols)}) "
+        f"VALUES(:feed_url, {', '.join(':' + k for k in cols)}) "
+        f"ON CONFLICT(feed_url) DO UPDATE SET {', '.join(f'{k}=excluded.{k}' for k in cols)}",
+        state,
+    )
+    conn.commit(); conn.close()
+
+@metrics.timed("summ_db_seconds", op="cache_get")
+def cache_get(key: str) -> Dict[str, Any] | None:
+    conn = connect(); cur = conn.cursor()
+    cur.execute("SELECT value, ok, fetched_at, expires_at FROM site_cache WHERE key=?", (key,))
+    r = cur.fetchone(); conn.close()
+    return dict(r) if r else None
+
+@metrics.timed("summ_db_seconds", op="cache_put")
+def cache_put(key: str, value: str, ok: bool, fetched_at: float, expires_at: float, max_entries: int) -> None:
+    conn = connect(); cur = conn.cursor()
+    cur.execute(
+        "INSERT OR REPLACE INTO site_cache(key, value, ok, fetched_at, expires_at) VALUES(?,?,?,?,?)",
+        (key, value, int(ok), fetched_at, expires_at),
+    )
+    # size bound: keep only the most recently fetched entries
+    cur.execute(
+        "DELETE FROM site_cache WHERE key IN "
+        "(SELECT key FROM site_cache ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+        (max_entries,),
+    )
+    conn.commit(); conn.close()
+
+# --- retention (see app.retention) ---
+
+@metrics.timed("summ_db_seconds", op="archive_summaries")
+def archive_summaries(cutoff: str, batch: int = 500) -> int:
+    """
+    Move summaries created before `cutoff` (ISO timestamp) to the archive DB,
+    one transaction per batch. Returns the number of rows moved.
+    """
+    conn = connect(archive=True); cur = conn.cursor()
+    moved = 0
+    while True:
+        cur.execute("SELECT url FROM main.summaries WHERE created_at < ? ORDER BY created_at LIMIT ?",
+                    (cutoff, batch))
+        urls = [r[0] for r in cur.fetchall()]
+        if not urls:
+            break
+        marks = ",".join("?" for _ in urls)
+        cur.execute(f"INSERT OR REPLACE INTO archive.summaries SELECT * FROM main.summaries WHERE url IN ({marks})",
+                    urls)
+        cur.execute(f"INSERT OR REPLACE INTO main.archived_urls(url, content_hash, archived_at) "
+                    f"SELECT url, content_hash, ? FROM main.summaries WHERE url IN ({marks})",
+                    [datetime.now(timezone.utc).isoformat(), *urls])
+        cur.execute(f"DELETE FROM main.summaries WHERE url IN ({marks})", urls)
+        _bump_generation(cur)
+        conn.commit()
+        moved += len(urls)
+    conn.close()
+    return moved
+
+@metrics.timed("summ_db_seconds", op="prune_runs")
+def prune_runs(cutoff: str) -> Dict[str, int]:
+    """
+    Drop run history finished before `cutoff`: runs (never the latest, nor one
+    an unfinished backfill job still writes to), finished backfill jobs, and
+    traces/queue items whose parent is gone.
+    """
+    conn = connect(); cur = conn.cursor()
+    out = {}
+    cur.execute("DELETE FROM backfill_jobs WHERE status='done' AND updated_at < ?", (cutoff,))
+    out["backfill_jobs"] = cur.rowcount
+    cur.execute("DELETE FROM backfill_items WHERE job_id NOT IN (SELECT id FROM backfill_jobs)")
+    out["backfill_items"] = cur.rowcount
+    cur.execute(
+        """DELETE FROM runs WHERE finished_at < ?
+             AND id < (SELECT MAX(id) FROM runs)
+             AND id NOT IN (SELECT run_id FROM backfill_jobs)""",
+        (cutoff,),
+    )
+    out["runs"] = cur.rowcount
+    cur.execute("DELETE FROM article_traces WHERE run_id NOT IN (SELECT id FROM runs)")
+    out["article_traces"] = cur.rowcount
+    conn.commit(); conn.close()
+    return out
+
+@metrics.timed("summ_db_seconds", op="compact")
+def compact(vacuum_pages: int, analysis_limit: int = 1000) -> Dict[str, int]:
+    """
+    Return free pages to the filesystem and refresh planner statistics.
+    The first call on a DB created without auto_vacuum does one full VACUUM to
+    switch it to incremental mode; later calls free at most `vacuum_pages`.
+    """
+    conn = connect()
+    conn.isolation_level = None  # VACUUM cannot run inside a transaction
+    cur = conn.cursor()
+    freelist = cur.execute("PRAGMA freelist_count").fetchone()[0]
+    if cur.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cur.execute("VACUUM")
+    else:
+        cur.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+        cur.fetchall()
+    # bounded (sampled) ANALYZE so this stays cheap as tables grow
+    cur.execute(f"PRAGMA analysis_limit={int(analysis_limit)}")
+    cur.execute("ANALYZE")
+    left = cur.execute("PRAGMA freelist_count").fetchone()[0]
+    pages = cur.execute("PRAGMA page_count").fetchone()[0]
+    conn.close()
+    return {"freed_pages": max(0, freelist - left), "page_count": pages}
@@ -1,74 +1,127 @@
+import os
 import time
+import calendar
 import socket
 import requests
 import feedparser
 import trafilatura
 import urllib.parse as urlparse
 import urllib.robotparser as robotparser
-from collections import defaultdict
 from app.config import settings
 from app.logging import setup
-from bs4 import BeautifulSoup
-import urllib.parse as urlparse
+from app import sitecache, ratelimit, workers, metrics
+from lxml import etree
 
 log = setup()
 
 HEADERS = {"User-Agent": settings.user_agent}
 TIMEOUT = settings.request_timeout_s
-# minimal in-memory rate limit: one hit per domain every 0.5s
-_LAST_HIT = defaultdict(float)
-_MIN_GAP = 0.5
-# robots cache per origin
-_ROBOTS = {}
+ROBOTS_TIMEOUT = min(TIMEOUT, 5)
+# bounded extraction: never download/parse more than this per page
+MAX_HTML_BYTES = int(os.getenv("MAX_HTML_BYTES", str(2 * 1024 * 1024)))
+HEAD_SCAN_BYTES = 64 * 1024
+MAX_FEED_BYTES = int(os.getenv("MAX_FEED_BYTES", str(5 * 1024 * 1024)))
+# text kept from extraction; summarizer trims further to its own budget
+EXTRACT_CHAR_CAP = settings.input_char_cap * 4
+# if the fast (no-fallback) trafilatura pass yields this much, skip the full pass
+ENOUGH_TEXT_CHARS = 1500
+# pooled connections for all direct requests
+_session = requests.Session()
+_session.headers.update(HEADERS)
 
 def _origin(url: str) -> str:
     u = urlparse.urlsplit(url)
     return f"{u.scheme}://{u.netloc}"
 
-def _respect_rate_limit(url: str):
-    dom = urlparse.urlsplit(url).netloc
-    now = time.time()
-    gap = now - _LAST_HIT[dom]
-    if gap < _MIN_GAP:
-        time.sleep(_MIN_GAP - gap)
-    _LAST_HIT[dom] = time.time()
+def _load_robots(origin: str) -> str | None:
+    """robots.txt body for origin; None (negative-cached) on network/5xx errors."""
+    r = _session.get(urlparse.urljoin(origin, "/robots.txt"), timeout=ROBOTS_TIMEOUT)
+    if r.status_code in (401, 403):
+        return "User-agent: *\nDisallow: /"
+    if 400 <= r.status_code < 500:
+        return ""  # no robots.txt: everything allowed
+    if r.status_code >= 500:
+        return None
+    return r.text
+
+def _parse_robots(body: str, ok: bool) -> robotparser.RobotFileParser | None:
+    if not ok:
+        return None  # robots fetch failed: be conservative but allow
+    rp = robotparser.RobotFileParser()
+    rp.parse(body.splitlines())
+    return rp
 
+@metrics.timed("summ_stage_seconds", stage="robots")
 def _robots_allowed(url: str) -> bool:
+    if ratelimit.is_open(url):
+        return True  # the request itself short-circuits; don't fetch (and negative-cache) robots.txt meanwhile
     origin = _origin(url)
-    rp = _ROBOTS.get(origin)
+    rp = sitecache.get(f"robots:{origin}", lambda: _load_robots(origin), _parse_robots)
     if rp is None:
-        rp = robotparser.RobotFileParser()
-        robots_url = urlparse.urljoin(origin, "/robots.txt")
-        try:
-            rp.set_url(robots_url)
-            rp.read()
-        except Exception:
-            # if robots fetch fails, be conservative but allow
-            pass
-        _ROBOTS[origin] = rp
+        return True
     try:
         return rp.can_fetch(settings.user_agent, url)
     except Exception:
         return True  # if parser incomplete, default allow
-       
-def _request(url: str, max_retries: int = 3) -> str:
-    backoff = 0.5
+
+def _read_capped(r: requests.Response, max_bytes: int) -> bytes:
+    buf = bytearray()
+    for chunk in r.iter_content(chunk_size=64 * 1024):
+        buf += chunk
+        if len(buf) >= max_bytes:
+            del buf[max_bytes:]
+            break
+    return bytes(buf)
+
+@metrics.timed("summ_stage_seconds", stage="http")
+def _http_get(url: str, max_retries: int = 3, max_bytes: int = MAX_HTML_BYTES,
+              headers: dict | None = None) -> tuple[int, dict, bytes]:
+    """(status, response headers, capped body); status 0 if no response was usable."""
+    # spacing between retries comes from the per-domain limiter (app.ratelimit)
     for attempt in range(1, max_retries + 1):
         try:
-            _respect_rate_limit(url)
-            r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
-            if 200 <= r.status_code < 300:
-                return r.text
-            # 4xx except 429: do not retry
-            if 400 <= r.status_code < 500 and r.status_code != 429:
-                log.warning("HTTP %s for %s (no retry)", r.status_code, url)
-                return ""
-            log.warning("HTTP %s for %s (retry %d)", r.status_code, url, attempt)
-        except (requests.Timeout, requests.ConnectionError, socket.timeout) as e:
+            ratelimit.acquire(url)
+        except ratelimit.CircuitOpen:
+            log.info("circuit open for %s, skipping", urlparse.urlsplit(url).netloc)
+            return 0, {}, b""
+        last = attempt == max_retries
+        t0 = time.monotonic()
+        try:
+            with _session.get(url, timeout=TIMEOUT, stream=True, headers=headers) as r:
+                body = _read_capped(r, max_bytes) if 200 <= r.status_code < 300 else b""
+        except (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.ContentDecodingError, socket.timeout) as e:
+            ratelimit.record(url, time.monotonic() - t0, error=True, final=last)
             log.warning("net error %s on %s (retry %d)", type(e).__name__, url, attempt)
-        time.sleep(backoff)
-        backoff *= 2
-    return ""
+            continue
+        except requests.RequestException as e:
+            # bad scheme/URL, redirect loop, ...: retrying will not help
+            log.warning("request error %s on %s (no retry)", type(e).__name__, url)
+            return 0, {}, b""
+        retry_after = ratelimit.parse_retry_after(r.headers.get("Retry-After"))
+        status = r.status_code
+        # a long Retry-After means we give up now rather than stall the whole refresh;
+        # record() then opens the domain's breaker until it has passed
+        give_up = last or bool(retry_after and retry_after > ratelimit.RETRY_AFTER_MAX_WAIT_S)
+        ratelimit.record(url, time.monotonic() - t0, status, retry_after, final=give_up)
+        if 200 <= status < 300 or status == 304:
+            return status, r.headers, body
+        # 4xx except 429: do not retry
+        if 400 <= status < 500 and status != 429:
+            log.warning("HTTP %s for %s (no retry)", status, url)
+            return status, r.headers, b""
+        if give_up and not last:
+            log.warning("HTTP %s for %s (Retry-After %.0fs, giving up)", status, url, retry_after)
+            return status, r.headers, b""
+        log.warning("HTTP %s for %s (retry %d)", status, url, attempt)
+    return 0, {}, b""
+
+def _request_bytes(url: str, max_retries: int = 3, max_bytes: int = MAX_HTML_BYTES) -> bytes:
+    status, _, body = _http_get(url, max_retries, max_bytes)
+    return body if 200 <= status < 300 else b""
+
+def _request(url: str, max_retries: int = 3) -> str:
+    return _request_bytes(url, max_retries).decode("utf-8", "replace")
 
 def _absolutize(base: str, url: str) -> str:
     try:
@@ -98,107 +151,215 @@ def _image_from_feed_entry(e: dict, base_url: str) -> str:
         if u: return _absolutize(base_url, u)
     return ""
 
-def _image_from_html(html: str, page_url: str) -> str:
+def scan_head(html: bytes | str, max_bytes: int = MAX_HTML_BYTES) -> dict:
+    """
+    Stream-parse just enough of a page to read its <head> metadata.
+    Returns a dict with any of: og:image, twitter:image, og:site_name, title, img
+    (first <img src> in the body, only looked for when no meta image exists).
+    """
+    data = html.encode("utf-8") if isinstance(html, str) else html
+    data = data[:max_bytes]
+    found: dict = {}
+    parser = etree.HTMLPullParser(events=("start", "end"))
     try:
-        soup = BeautifulSoup(html, "html.parser")
-        # Prefer og:image then twitter:image then first <img>
-        for prop in [
-            ('meta', {'property': 'og:image'}, 'content'),
-            ('meta', {'name': 'twitter:image'}, 'content'),
-        ]:
-            tag = soup.find(prop[0], prop[1])
-            if tag and tag.get(prop[2]):
-                return _absolutize(page_url, tag.get(prop[2]))
-        img = soup.find("img")
-        if img and img.get("src"):
-            return _absolutize(page_url, img.get("src"))
-    except Exception:
+        for i in range(0, len(data), 16 * 1024):
+            parser.feed(data[i:i + 16 * 1024])
+            for ev, el in parser.read_events():
+                tag = el.tag if isinstance(el.tag, str) else ""
+                if ev == "start" and tag == "meta":
+                    key = el.get("property") or el.get("name")
+                    if key in ("og:image", "twitter:image", "og:site_name") and el.get("content"):
+                        found.setdefault(key, el.get("content").strip())
+                elif ev == "end" and tag == "title" and el.text:
+                    found.setdefault("title", el.text.strip())
+                elif ev == "start" and tag == "body" and ("og:image" in found or "twitter:image" in found):
+                    return found
+                elif ev == "start" and tag == "img" and el.get("src"):
+                    found["img"] = el.get("src")
+                    return found
+    except etree.LxmlError:
         pass
+    return found
+
+def _image_from_html(html: bytes | str, page_url: str) -> str:
+    # Prefer og:image then twitter:image then first <img>
+    meta = scan_head(html)
+    for key in ("og:image", "twitter:image", "img"):
+        if meta.get(key):
+            return _absolutize(page_url, meta[key])
     return ""
 
-def get_best_image(url: str, feed_entry: dict | None = None) -> str:
-    """Try feed-provided image, else parse page HTML for og:image."""
+def get_best_image(url: str, feed_entry: dict | None = None, html: bytes | None = None) -> str:
+    """Try feed-provided image, else scan page HTML for og:image (fetched if not given)."""
     base = _origin(url)
     if feed_entry:
         u = _image_from_feed_entry(feed_entry, base)
         if u: return u
-    html = fetch_html(url)
+    if html is None:
+        html = fetch_page(url)
     if html:
         u = _image_from_html(html, url)
         if u: return u
     return ""
 
+def _load_site_name(url: str) -> str | None:
+    # only the <head> is needed for og:site_name / <title>
+    html = _request_bytes(url, max_retries=1, max_bytes=HEAD_SCAN_BYTES)
+    if not html:
+        return None
+    meta = scan_head(html)
+    if meta.get("og:site_name"):
+        return meta["og:site_name"]
+    if meta.get("title"):
+        # use only the first segment before a dash or bar
+        base = meta["title"].split("–")[0].split("|")[0]
+        return base.strip() or None
+    return None
+
 def get_site_name(url: str, default: str = "") -> str:
-    try:
-        # Try a quick HTML HEAD/GET for og:site_name
-        resp = requests.get(url, timeout=4)
-        if resp.ok:
-            soup = BeautifulSoup(resp.text, "html.parser")
-            meta = soup.find("meta", attrs={"property": "og:site_name"})
-            if meta and meta.get("content"):
-                return meta["content"].strip()
-            # fall back to <title>
-            title = soup.find("title")
-            if title and title.text:
-                # use only the first segment before a dash or bar
-                base = title.text.strip().split("–")[0].split("|")[0]
-                return base.strip()
-    except Exception:
-        pass
+    name = sitecache.get(f"site_name:{url}", lambda: _load_site_name(url))
+    if name:
+        return name
     # fallback to cleaned domain if all else fails
-    from urllib.parse import urlsplit
-    host = urlsplit(url).netloc
+    host = urlparse.urlsplit(url).netloc
     host = host.replace("www.", "")
     return default or host.capitalize()
 
-def get_feed_entries(feed_url: str, limit: int = 10):
-    parsed = feedparser.parse(feed_url)
+def _entry_ts(e: dict) -> float | None:
+    st = e.get("published_parsed") or e.get("updated_parsed")
+    return float(calendar.timegm(st)) if st else None
+
+def _parse_feed(raw: bytes, feed_url: str, limit: int,
+                stop_guid: str | None = None, stop_ts: float | None = None,
+                content_type: str | None = None) -> tuple[str, list[dict], list[float]]:
+    """
+    feedparser step; runs in the parse pool, so it returns plain picklable data.
+    Entries are taken newest-first until the watermark (stop_guid, or anything
+    published before stop_ts) is reached. Also returns the publish timestamps
+    of the first `limit` entries, for publish-rate estimation.
+    content_type is the HTTP Content-Type, which may carry the only charset
+    declaration. (The body is already transfer-decoded, so Content-Encoding is
+    deliberately not passed on.)
+    """
+    response_headers = {"content-location": feed_url}
+    if content_type:
+        response_headers["content-type"] = content_type
+    parsed = feedparser.parse(raw, response_headers=response_headers)
     feed_title = (getattr(parsed.feed, "title", None) or "").strip()
-    site_name = feed_title or get_site_name(feed_url)
+    head = parsed.entries[:limit]
+    stamps = [t for t in (_entry_ts(e) for e in head) if t is not None]
     out = []
-    for e in parsed.entries[:limit]:
+    for e in head:
         url = e.get("link") or ""
-        image_url = _image_from_feed_entry(e, base_url=feed_url) if url else ""
+        guid = e.get("id") or url
+        ts = _entry_ts(e)
+        if stop_guid and guid == stop_guid:
+            break
+        if stop_ts is not None and ts is not None and ts < stop_ts:
+            break
         out.append({
             "url": url,
+            "guid": guid,
             "title": e.get("title") or "(no title)",
             "published_at": e.get("published") or e.get("updated") or "",
-            "image_url": image_url,
-            "feed_title": site_name,   
+            "published_ts": ts,
+            "image_url": _image_from_feed_entry(e, base_url=feed_url) if url else "",
         })
+    return feed_title, out, stamps
+
+@metrics.timed("summ_stage_seconds", stage="feed")
+def get_feed_entries(feed_url: str, limit: int = 10, state: dict | None = None):
+    """
+    Newest entries of a feed, at most `limit`.
+    With `state` (a feed_state row) the request is conditional on its etag /
+    last_modified and iteration stops at its last_guid / last_published
+    watermark; state is updated in place with the new validators, whether the
+    feed was unchanged ("not_modified") and the entries' publish timestamps.
+    """
+    headers = {}
+    if state is not None:
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+    status, resp_headers, raw = _http_get(feed_url, max_bytes=MAX_FEED_BYTES, headers=headers or None)
+    if state is not None:
+        state["not_modified"] = status == 304
+        if raw:
+            state["etag"] = resp_headers.get("ETag")
+            state["last_modified"] = resp_headers.get("Last-Modified")
+    if not raw:
+        return []
+    stop_guid = state.get("last_guid") if state else None
+    stop_ts = state.get("last_published") if state else None
+    feed_title, out, stamps = workers.run(_parse_feed, raw, feed_url, limit, stop_guid, stop_ts,
+                                          resp_headers.get("Content-Type"))
+    if state is not None:
+        state["published_ts"] = stamps
+    if not out:
+        return []
+    site_name = feed_title or get_site_name(feed_url)
+    for e in out:
+        e["feed_title"] = site_name
     return out
 
-def fetch_html(url: str) -> str:
+def fetch_page_status(url: str) -> tuple[int | None, bytes]:
+    """
+    (status, raw page bytes capped at MAX_HTML_BYTES); the body is b"" unless 2xx.
+    status is None if robots.txt disallows the URL, 0 if no response was usable.
+    """
     if not _robots_allowed(url):
         log.info("blocked by robots.txt %s", url)
-        return ""
-    return _request(url)
+        return None, b""
+    status, _, body = _http_get(url)
+    return status, (body if 200 <= status < 300 else b"")
 
-def extract_main_text(url: str) -> str:
-    if not _robots_allowed(url):
-        log.info("blocked by robots.txt %s", url)
-        return ""
-    # try trafilatura direct fetch first
-    try:
-        _respect_rate_limit(url)
-        html = trafilatura.fetch_url(url, no_ssl=True)
-    except Exception:
-        html = None
-    if not html:
-        html = fetch_html(url)
+def fetch_page(url: str) -> bytes:
+    """Raw page bytes (capped at MAX_HTML_BYTES); b"" if blocked or failed."""
+    return fetch_page_status(url)[1]
+
+def retryable(status: int | None) -> bool:
+    """True for fetches that may work on a later run: no response (network error, open circuit), 429 or 5xx."""
+    return status is not None and (status == 0 or status == 429 or status >= 500)
+
+def fetch_html(url: str) -> str:
+    return fetch_page(url).decode("utf-8", "replace")
+
+def extract_text(html: bytes | str) -> str:
+    """Main text of a page: fast trafilatura pass first, full pass only if it came up short."""
     if not html:
         return ""
+    opts = dict(
+        include_comments=False,
+        include_images=False,
+        include_tables=False,
+        favor_precision=True,
+    )
     try:
-        text = trafilatura.extract(
-            html,
-            include_comments=False,
-            include_images=False,
-            include_tables=False,
-            favor_precision=True,
-        )
-        return text or ""
+        text = trafilatura.extract(html, fast=True, **opts) or ""
+        if len(text) < ENOUGH_TEXT_CHARS:
+            text = trafilatura.extract(html, **opts) or text
     except Exception:
         return ""
+    return text[:EXTRACT_CHAR_CAP]
+
+@metrics.timed("summ_stage_seconds", stage="extract")
+def extract_main_text(url: str, html: bytes | None = None) -> str:
+    if html is None:
+        html = fetch_page(url)
+    if not html:
+        return ""
+    return workers.run(extract_text, html)
+
+def _parse_page(html: bytes, url: str, want_image: bool) -> tuple[str, str]:
+    return extract_text(html), (_image_from_html(html, url) if want_image else "")
+
+@metrics.timed("summ_stage_seconds", stage="extract")
+def parse_page(url: str, html: bytes, want_image: bool = True) -> tuple[str, str]:
+    """(main text, page image) from fetched bytes, in one parse-pool round trip."""
+    if not html:
+        return "", ""
+    return workers.run(_parse_page, html, url, want_image)
 
 def polite_delay(seconds: float = 0.3):
     time.sleep(seconds)
@@ -4,6 +4,7 @@ import re
 from typing import List, Dict, Tuple
 from urllib.parse import urlsplit
 import hashlib
+from functools import lru_cache
 
 
 WORD_BOUNDARY = r"(?:^|[^A-Za-z0-9_])"  # simple non-word boundary
@@ -31,6 +32,7 @@ def _parse_lines(lines: List[str]) -> Tuple[List[str], Dict[str, List[str]]]:
             globals_.append(ln)
     return globals_, per_dom
 
+@lru_cache(maxsize=4096)
 def _make_pattern(term: str) -> re.Pattern:
     """Quoted strings become exact phrase; otherwise word-boundary match."""
     if len(term) >= 2 and term[0] == term[-1] == '"':
@@ -0,0 +1,184 @@
+"""
+Local thumbnail cache for article images, served from /img/<key>.<ext>.
+
+At ingest each article image is downloaded once, resized to THUMB_WIDTH and
+re-encoded (WebP, JPEG if this Pillow lacks WebP), and stored under
+data/images/ keyed by the SHA-1 of the thumbnail bytes. Serving a file bumps
+its mtime; when the cache grows past IMAGE_CACHE_MAX_MB the least recently
+used files are evicted. Images that cannot be fetched or decoded become the
+placeholder. Without Pillow installed, remote URLs are kept as before.
+"""
+from __future__ import annotations
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+from app import db, fetch, metrics, workers
+from app.config import DATA_DIR
+from app.logging import setup
+
+try:
+    from PIL import Image, features
+except ImportError:  # optional dependency
+    Image = None
+    features = None
+
+log = setup()
+
+CACHE_DIR = DATA_DIR / "images"
+MAX_CACHE_BYTES = int(float(os.getenv("IMAGE_CACHE_MAX_MB", "200")) * 1024 * 1024)
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+THUMB_WIDTH = int(os.getenv("THUMB_WIDTH", "640"))
+QUALITY = 75
+PLACEHOLDER_IMAGE = "/static/no-image.jpg"
+URL_PREFIX = "/img/"
+
+_NAME_RE = re.compile(r"^[0-9a-f]{40}\.(webp|jpg)$")
+_lock = threading.Lock()
+_approx_bytes: int | None = None  # running total, rescanned on eviction
+
+
+def enabled() -> bool:
+    return Image is not None
+
+
+def _thumbnail(raw: bytes) -> tuple[bytes, str] | None:
+    """Resize/re-encode image bytes; None if they are not a decodable image. Runs in the parse pool."""
+    try:
+        with Image.open(io.BytesIO(raw)) as im:
+            im.draft("RGB", (THUMB_WIDTH * 2, THUMB_WIDTH * 2))  # cheap JPEG downscale on decode
+            im = im.convert("RGB")
+            if im.width > THUMB_WIDTH:
+                im = im.resize((THUMB_WIDTH, max(1, round(im.height * THUMB_WIDTH / im.width))), Image.LANCZOS)
+            out = io.BytesIO()
+            if features.check("webp"):
+                im.save(out, "WEBP", quality=QUALITY, method=4)
+                return out.getvalue(), "webp"
+            im.save(out, "JPEG", quality=QUALITY, optimize=True, progressive=True)
+            return out.getvalue(), "jpg"
+    except Exception:
+        return None
+
+
+def _path(name: str) -> Path:
+    return CACHE_DIR / name[:2] / name
+
+
+def _scan() -> list[tuple[float, int, Path]]:
+    out = []
+    if CACHE_DIR.exists():
+        for p in CACHE_DIR.glob("*/*"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            out.append((st.st_mtime, st.st_size, p))
+    return out
+
+
+def _evict_if_needed(added: int) -> None:
+    global _approx_bytes
+    with _lock:
+        if _approx_bytes is None:
+            _approx_bytes = sum(size for _, size, _ in _scan())
+        _approx_bytes += added
+        if _approx_bytes <= MAX_CACHE_BYTES:
+            return
+        files = sorted(_scan())  # oldest mtime first
+        total = sum(size for _, size, _ in files)
+        target = int(MAX_CACHE_BYTES * 0.9)
+        for _, size, p in files:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                pass
+        _approx_bytes = total
+        log.info("image cache evicted down to %.1f MiB", total / 2**20)
+
+
+@metrics.timed("summ_stage_seconds", stage="image")
+def cache_image(url: str) -> str:
+    """
+    Local thumbnail URL for a remote image, the placeholder if it is dead,
+    or the URL unchanged if it is already local or Pillow is unavailable.
+    """
+    if not url or url.startswith("/"):
+        return url or PLACEHOLDER_IMAGE
+    if not enabled():
+        return url
+    try:
+        raw = fetch._request_bytes(url, max_retries=2, max_bytes=MAX_SOURCE_BYTES)
+    except ValueError:  # malformed URL from the feed/page, e.g. a broken IPv6 host
+        raw = b""
+    thumb = workers.run(_thumbnail, raw) if raw else None
+    if not thumb:
+        log.info("dead image %s, using placeholder", url)
+        return PLACEHOLDER_IMAGE
+    data, ext = thumb
+    name = f"{hashlib.sha1(data).hexdigest()}.{ext}"
+    path = _path(name)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        _evict_if_needed(len(data))
+    return URL_PREFIX + name
+
+
+def lookup(name: str) -> Path | None:
+    """Cached file for /img/<name>, touched for LRU; None if unknown or evicted."""
+    if not _NAME_RE.match(name):
+        return None
+    path = _path(name)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def revalidate(limit: int = 500) -> dict:
+    """
+    Re-check stored image_urls: evicted local thumbnails, remote URLs and
+    placeholders that kept their image_source (the fetch failed at ingest) are
+    re-fetched into the cache, dead ones replaced with the placeholder.
+    Runs with the periodic maintenance (app.retention) and --validate-images.
+    """
+    db.init_db()
+    conn = db.connect(); cur = conn.cursor()
+    cur.execute("SELECT url, summary_json FROM summaries ORDER BY created_at DESC LIMIT ?", (limit,))
+    rows = cur.fetchall()
+    conn.close()
+    stats = {"checked": 0, "cached": 0, "placeholder": 0}
+    for row in rows:
+        data = json.loads(row["summary_json"])
+        img = data.get("image_url") or ""
+        stats["checked"] += 1
+        if img == PLACEHOLDER_IMAGE and not data.get("image_source"):
+            continue
+        if img.startswith(URL_PREFIX) and lookup(img[len(URL_PREFIX):]):
+            continue
+        # evicted thumbnails can only be recovered from the original remote URL
+        source = data.get("image_source") or ("" if img.startswith("/") else img)
+        new = cache_image(source) if source else PLACEHOLDER_IMAGE
+        if new == img:
+            continue
+        stats["placeholder" if new == PLACEHOLDER_IMAGE else "cached"] += 1
+        data["image_url"] = new
+        if source:
+            data["image_source"] = source
+        conn = db.connect()
+        conn.execute("UPDATE summaries SET summary_json=? WHERE url=?",
+                     (json.dumps(data, ensure_ascii=False), row["url"]))
+        conn.commit(); conn.close()
+    if stats["cached"] or stats["placeholder"]:
+        db.bump_generation()
+    return stats
@@ -0,0 +1,156 @@
+"""
+In-process timing histograms, rendered in Prometheus text format at /metrics.
+
+Metrics:
+  summ_stage_seconds{stage}                 ingest stages (feed, robots, http, extract, llm,
+                                            image = thumbnail download/resize)
+  summ_db_seconds{op}                       app.db calls
+  summ_http_request_seconds{handler,method,status}   API handlers
+
+Ingest runs also collect their own totals (collect()/bind()): observations made
+in the run's thread, or in worker threads bound to it, are added to a
+run-local RunTotals as well, so concurrent API requests are not charged to it.
+"""
+from __future__ import annotations
+import contextvars
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "summ_stage_seconds": "Time spent in ingest stages.",
+    "summ_db_seconds": "Time spent in SQLite calls.",
+    "summ_http_request_seconds": "API request handling time.",
+}
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+_lock = threading.Lock()
+_hists: Dict[_Key, _Histogram] = {}
+
+
+class RunTotals:
+    """Seconds per (metric, labels) observed within one ingest run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sums: Dict[_Key, float] = {}
+
+    def add(self, key: _Key, seconds: float) -> None:
+        with self._lock:
+            self._sums[key] = self._sums.get(key, 0.0) + seconds
+
+    def totals(self, name: str, label: str) -> Dict[str, float]:
+        """Summed seconds of one metric in this run, per value of `label`."""
+        out: Dict[str, float] = {}
+        with self._lock:
+            for (n, labels), s in self._sums.items():
+                if n == name:
+                    value = dict(labels).get(label, "")
+                    out[value] = out.get(value, 0.0) + s
+        return out
+
+
+_run: contextvars.ContextVar[RunTotals | None] = contextvars.ContextVar("summ_run_totals", default=None)
+
+
+@contextmanager
+def collect():
+    """Collect this context's observations into a fresh RunTotals (yielded)."""
+    run = RunTotals()
+    token = _run.set(run)
+    try:
+        yield run
+    finally:
+        _run.reset(token)
+
+
+def bind(fn):
+    """Wrap fn so that, run on another thread (e.g. an executor), it reports into the caller's run."""
+    run = _run.get()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _run.set(run)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _run.reset(token)
+    return wrapper
+
+
+def observe(name: str, seconds: float, **labels: str) -> None:
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    run = _run.get()
+    if run is not None:
+        run.add(key, seconds)
+    with _lock:
+        h = _hists.get(key)
+        if h is None:
+            h = _hists[key] = _Histogram()
+        h.counts[bisect_left(BUCKETS, seconds)] += 1
+        h.sum += seconds
+        h.count += 1
+
+
+@contextmanager
+def timer(name: str, **labels: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, **labels)
+
+
+def timed(name: str, **labels: str):
+    """Decorator form of timer()."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def _fmt_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[str, str] | None = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def render() -> str:
+    with _lock:
+        snap = sorted(((k, list(h.counts), h.sum, h.count) for k, h in _hists.items()), key=lambda x: x[0])
+    lines = []
+    seen = set()
+    for (name, labels), counts, total, count in snap:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        cum = 0
+        for le, c in zip(list(BUCKETS) + ["+Inf"], counts):
+            cum += c
+            le_s = le if isinstance(le, str) else repr(le)
+            lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', le_s))} {cum}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
@@ -1,21 +1,33 @@
+import time
+import sqlite3
+import threading
+from collections import Counter
+from statistics import median
 from typing import List, Dict, Any
 from datetime import datetime, timezone
 from urllib.parse import urlsplit
 from email.utils import parsedate_to_datetime
 
-from app import fetch, filters, db
-from app.summarizer import summarize_article
-from app.util import load_lines
+from openai import APIError
 
-PLACEHOLDER_IMAGE = "/static/no-image.jpg"
+from app import fetch, filters, db, registry, ratelimit, metrics, images
+from app.summarizer import summarize_article, SummaryError
+
+PLACEHOLDER_IMAGE = images.PLACEHOLDER_IMAGE
+
+# held by in-process callers (POST /refresh, app.scheduler) so runs never overlap
+RUN_LOCK = threading.Lock()
 
 def _has_hash(content_hash: str) -> bool:
     """Return True if this content hash already exists in the DB."""
-    conn = db.connect()
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM summaries WHERE content_hash=?", (content_hash,))
-    found = cur.fetchone()
-    conn.close()
+    with metrics.timer("summ_db_seconds", op="has_hash"):
+        conn = db.connect()
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM summaries WHERE content_hash=? "
+                    "UNION ALL SELECT 1 FROM archived_urls WHERE content_hash=? LIMIT 1",
+                    (content_hash, content_hash))
+        found = cur.fetchone()
+        conn.close()
     return bool(found)
 
 def _normalize_published(s: str | None) -> str:
@@ -45,112 +57,238 @@ def _format_date_eu(iso_ts: str | None) -> str:
     except Exception:
         return ""
 
+def _stage_totals(run: metrics.RunTotals) -> Dict[str, float]:
+    """
+    Seconds per ingest stage within one run (plus its DB calls as 'db').
+    Stages nest -- "http" is also inside "feed", "robots" and "image", and
+    "db" inside most of them -- so they overlap and do not add up to the
+    run's wall time.
+    """
+    totals = run.totals("summ_stage_seconds", "stage")
+    totals["db"] = sum(run.totals("summ_db_seconds", "op").values())
+    return totals
+
+def _publish_interval_s(published: List[float | None]) -> float | None:
+    """Median gap between consecutive entry timestamps (epoch), or None if unknown."""
+    ts = sorted(p for p in published if p)
+    gaps = [b - a for a, b in zip(ts, ts[1:]) if b > a]
+    return median(gaps) if gaps else None
+
+def _advance_watermark(feed_url: str, state: Dict[str, Any], entries: List[Dict[str, Any]],
+                       oldest_failed: int | None = None) -> None:
+    """
+    Persist the feed's newest processed entry and HTTP validators.
+    entries[oldest_failed] is the oldest entry that was not stored ("retry" or
+    "errors"): the watermark only moves up to the entry just below it and the
+    validators are dropped, so the next run re-reads the feed from there.
+    """
+    if state.get("not_modified"):
+        return
+    update = {"feed_url": feed_url, "etag": state.get("etag"), "last_modified": state.get("last_modified")}
+    done = entries
+    if oldest_failed is not None:
+        update["etag"] = update["last_modified"] = None
+        done = entries[oldest_failed + 1:]
+    if done:
+        stamps = [e["published_ts"] for e in done if e.get("published_ts")]
+        last_published = max(stamps + [state.get("last_published") or 0.0])
+        if oldest_failed is not None:
+            # never past a failed entry's own timestamp, or the stop_ts check would skip it
+            failed = [e["published_ts"] for e in entries[:oldest_failed + 1] if e.get("published_ts")]
+            last_published = min([last_published] + failed)
+        update["last_guid"] = done[0].get("guid") or done[0].get("url")
+        update["last_published"] = last_published or None
+    db.save_feed_state(update)
+
+def _error_kind(ex: Exception) -> str:
+    """Coarse failure class for article_traces.error_kind and the run's error_kinds."""
+    if isinstance(ex, SummaryError):
+        return ex.kind              # llm_refusal, llm_truncated, llm_empty, llm_invalid
+    if isinstance(ex, APIError):
+        return "llm_api"
+    if isinstance(ex, sqlite3.Error):
+        return "db"
+    return "other"
+
+def _record_usage(trace: Dict[str, Any], usage: Dict[str, Any]) -> None:
+    trace["prompt_tokens"] = int(usage.get("input_tokens") or 0)
+    trace["output_tokens"] = int(usage.get("output_tokens") or 0)
+    trace["tokens_saved"] = int(usage.get("tokens_saved") or 0)
+
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
+def _ms(t0: float) -> int:
+    return int((time.perf_counter() - t0) * 1000)
+
+def _process_entry(e: Dict[str, Any], rules, dry_run: bool, trace: Dict[str, Any], polite: bool = True) -> str:
+    """
+    Fetch, filter, summarize and store one feed entry.
+    Returns the outcome ("summarized", "cached", "skipped", "retry" or "errors") and
+    fills `trace` with timings, bytes and token usage for article_traces.
+    """
+    url = e.get("url") or ""
+    title = e.get("title") or ""
+    published_at = e.get("published_at") or ""
+
+    domain = urlsplit(url).netloc or ""
+    norm_pub = _normalize_published(published_at)
+    source = (e.get("feed_title") or domain)
+    trace.update(url=url, domain=domain)
+
+    # URL-level cache
+    if db.has_url(url):
+        return "cached"
+
+    # Fetch once (robots + rate limiting + size cap handled in fetch),
+    # then parse text and page image from the same bytes (parse pool if enabled)
+    t0 = time.perf_counter()
+    status, html = fetch.fetch_page_status(url)
+    trace["fetch_ms"] = _ms(t0)
+    trace["bytes_fetched"] = len(html)
+    if fetch.retryable(status):
+        # network error, 429/5xx after retries or an open circuit: nothing was
+        # stored, so the watermark stays before this entry and a later run retries it
+        trace["error"] = f"fetch failed (HTTP {status})" if status else "fetch failed"
+        return "retry"
+    t0 = time.perf_counter()
+    text, page_image = fetch.parse_page(url, html, want_image=not e.get("image_url"))
+    trace["extract_ms"] = _ms(t0)
+
+    # Keyword / site rules (title + body)
+    if not filters.should_keep(url, title, text, rules):
+        return "skipped"
+
+    # Choose image (feed hint, best guess, placeholder)
+    image_url = e.get("image_url") or page_image or PLACEHOLDER_IMAGE
+
+    # Hash-level cache (avoid dup content across different URLs)
+    content_hash = filters.sha1((text or "")[:2000] or url)
+    if _has_hash(content_hash):
+        return "cached"
+
+    try:
+        if dry_run:
+            outcome = "summarized"
+        else:
+            t0 = time.perf_counter()
+            try:
+                data = summarize_article(url, title, text)
+            finally:
+                trace["llm_ms"] = _ms(t0)
+            usage = data.pop("_usage", None) or {}
+            _record_usage(trace, usage)
+            trace["repair"] = usage.get("repair") or None
+            # local thumbnail (or placeholder if the image is dead); keep the original for revalidation
+            data["image_url"] = images.cache_image(image_url)
+            if image_url != data["image_url"] and not image_url.startswith("/"):
+                data["image_source"] = image_url
+            data["domain"] = domain
+            data["source"] = source
+
+            if norm_pub:
+                data["published_at"] = norm_pub
+                data["published_date"] = _format_date_eu(norm_pub)
+                created_ts = norm_pub
+            else:
+                # fallback to "now" for both created_at and display date
+                today_iso = _now_iso()
+                data["published_date"] = _format_date_eu(today_iso)
+                created_ts = published_at or today_iso
+
+            db.insert_summary(data, content_hash, created_ts)
+            outcome = "summarized"
+
+    except Exception as ex:
+        outcome = "errors"
+        trace["error"] = f"{type(ex).__name__}: {ex}"[:300]
+        trace["error_kind"] = _error_kind(ex)
+        if isinstance(ex, SummaryError):
+            _record_usage(trace, ex.usage)  # count the tokens the failure cost
+
+    # be polite between entries (backfill relies on the per-domain limiter alone)
+    if polite:
+        fetch.polite_delay(0.3)
+    return outcome
+
 def run_once(
     feeds: List[str],
     includes: List[str] | None = None,   # kept for compatibility; can be removed later
     excludes: List[str] | None = None,
     per_feed: int = 5,
     dry_run: bool = False,
+    use_watermark: bool = True,
 ) -> Dict[str, Any]:
     """
     Process all feeds once.
-    Returns counters and URL details: seen, summarized, cached, skipped, errors, details.
+    Returns counters and URL details: seen, summarized, cached, skipped, retry, errors, details.
+    A per-article trace of the run is stored in article_traces.
+
+    With use_watermark each feed is fetched conditionally and read only down to
+    the newest entry processed last time, so per_feed is just an upper bound;
+    pass use_watermark=False to re-examine the first per_feed entries (backfill).
+
+    "stages" holds this run's own seconds per stage (see _stage_totals; they overlap).
     """
+    with metrics.collect() as run:
+        return _run_once(run, feeds, per_feed, dry_run, use_watermark)
+
+def _run_once(run: metrics.RunTotals, feeds: List[str], per_feed: int, dry_run: bool,
+              use_watermark: bool) -> Dict[str, Any]:
     db.init_db()
     started_at = _now_iso()
+    started_mono = time.monotonic()
 
-    # (re)load filter rules every run so edits take effect without restart
-    inc_lines = load_lines("data/include.txt")
-    exc_lines = load_lines("data/exclude.txt")
-    rules = filters.compile_rules(inc_lines, exc_lines)
+    # cached; recompiled only when include.txt/exclude.txt change on disk
+    rules = registry.filter_rules()
 
-    seen = summarized = cached = skipped = errors = 0
-    details = {"summarized": [], "cached": [], "skipped": [], "errors": []}
+    counts = {"seen": 0, "summarized": 0, "cached": 0, "skipped": 0, "retry": 0, "errors": 0}
+    details = {"summarized": [], "cached": [], "skipped": [], "retry": [], "errors": []}
+    traces: List[Dict[str, Any]] = []
+    feed_stats: Dict[str, Dict[str, Any]] = {}
+    states = db.feed_states() if use_watermark else {}
 
     for feed_url in feeds:
-        entries = fetch.get_feed_entries(feed_url, limit=per_feed)
-        for e in entries:
+        state = dict(states.get(feed_url) or {"feed_url": feed_url}) if use_watermark else None
+        entries = fetch.get_feed_entries(feed_url, limit=per_feed, state=state)
+        fs = feed_stats[feed_url] = {"entries": len(entries), "new": 0, "retry": 0, "errors": 0}
+        fs["not_modified"] = bool(state and state.get("not_modified"))
+        stamps = (state or {}).get("published_ts") or [e.get("published_ts") for e in entries]
+        fs["publish_interval_s"] = _publish_interval_s(stamps)
+        oldest_failed = None  # index of the oldest entry that was not stored and must be re-read
+        for i, e in enumerate(entries):
             url = e.get("url") or ""
-            title = e.get("title") or ""
-            published_at = e.get("published_at") or ""
             if not url:
                 continue
 
-            seen += 1  # count every entry we examine
+            counts["seen"] += 1  # count every entry we examine
+            trace: Dict[str, Any] = {}
+            outcome = _process_entry(e, rules, dry_run, trace)
+            counts[outcome] += 1
+            details[outcome].append(url)
+            trace["outcome"] = outcome
+            traces.append(trace)
+            if outcome == "summarized":
+                fs["new"] += 1
+            if outcome in ("retry", "errors"):
+                fs[outcome] += 1
+                oldest_failed = i
 
-            domain = urlsplit(url).netloc or ""
-            norm_pub = _normalize_published(published_at)
-            source = (e.get("feed_title") or domain)
-
-            # URL-level cache
-            if db.has_url(url):
-                cached += 1
-                details["cached"].append(url)
-                continue
-
-            # Fetch & extract main text (robots + rate limiting handled in fetch)
-            text = fetch.extract_main_text(url) or ""
-
-            # Keyword / site rules (title + body)
-            if not filters.should_keep(url, title, text, rules):
-                skipped += 1
-                details["skipped"].append(url)
-                continue
-
-            # Choose image (feed hint, best guess, placeholder)
-            image_url = e.get("image_url") or fetch.get_best_image(url, e) or PLACEHOLDER_IMAGE
-
-            # Hash-level cache (avoid dup content across different URLs)
-            content_hash = filters.sha1((text or "")[:2000] or url)
-            if _has_hash(content_hash):
-                cached += 1
-                details["cached"].append(url)
-                continue
-
-            try:
-                if dry_run:
-                    summarized += 1
-                    details["summarized"].append(url)
-                else:
-                    data = summarize_article(url, title, text)
-                    data["image_url"] = image_url
-                    data["domain"] = domain
-                    data["source"] = source
-
-                    if norm_pub:
-                        data["published_at"] = norm_pub
-                        data["published_date"] = _format_date_eu(norm_pub)
-                        created_ts = norm_pub
-                    else:
-                        # fallback to "now" for both created_at and display date
-                        today_iso = _now_iso()
-                        data["published_date"] = _format_date_eu(today_iso)
-                        created_ts = published_at or today_iso
-
-                    db.insert_summary(data, content_hash, created_ts)
-                    summarized += 1
-                    details["summarized"].append(url)
-
-            except Exception as ex:
-                errors += 1
-                details["errors"].append(url)
-                # optional: print or log
-                # print(f"Summarize error for {url}: {type(ex).__name__} {ex}")
-
-            # be polite between entries
-            fetch.polite_delay(0.3)
+        if use_watermark and not dry_run:
+            _advance_watermark(feed_url, state, entries, oldest_failed)
 
     result = {
-        "seen": seen,
-        "summarized": summarized,
-        "cached": cached,
-        "skipped": skipped,
-        "errors": errors,
+        **counts,
         "details": details,
+        "feeds": feed_stats,
+        "domains": ratelimit.snapshot(since=started_mono),
+        "tokens_saved": sum(t.get("tokens_saved", 0) for t in traces),
+        "error_kinds": dict(Counter(t["error_kind"] for t in traces if t.get("error_kind"))),
+        "repaired": sum(1 for t in traces if t.get("repair")),
     }
+    result["stages"] = {k: round(v, 3) for k, v in _stage_totals(run).items() if v > 0}
     finished_at = _now_iso()
-    db.record_run(result, started_at, finished_at)
-    return result
\ No newline at end of file
+    run_id = db.record_run(result, started_at, finished_at)
+    db.insert_traces(run_id, traces)
+    result["run_id"] = run_id
+    return result
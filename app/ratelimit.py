@@ -0,0 +1,152 @@
+"""
+Per-domain adaptive rate limiter and circuit breaker used by app.fetch.
+
+Each netloc gets its own minimum gap between requests. The gap follows the
+observed response latency, doubles on 429/5xx/network errors and honors
+Retry-After: a short one delays the domain's next slot, one longer than
+RETRY_AFTER_MAX_WAIT_S opens the breaker for that long instead, so callers
+skip the domain rather than sleep. After BREAKER_THRESHOLD consecutive failed requests (counted once
+per request after its retries, not per attempt) a domain is skipped for
+BREAKER_COOLDOWN_S; the next request after the cooldown is a probe.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from email.utils import parsedate_to_datetime
+from typing import Dict
+import urllib.parse as urlparse
+
+MIN_GAP_S = float(os.getenv("RATE_MIN_GAP_SECONDS", "0.5"))
+MAX_GAP_S = float(os.getenv("RATE_MAX_GAP_SECONDS", "30"))
+LATENCY_FACTOR = 1.0  # wait roughly one response time between hits
+MAX_RETRY_AFTER_S = 120.0
+RETRY_AFTER_MAX_WAIT_S = float(os.getenv("RETRY_AFTER_MAX_WAIT_SECONDS", "15"))
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "3"))
+BREAKER_COOLDOWN_S = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "300"))
+
+
+class CircuitOpen(Exception):
+    """Raised by acquire() while a domain's breaker is open."""
+
+
+@dataclass
+class DomainState:
+    gap: float = MIN_GAP_S
+    next_at: float = 0.0
+    latency: float = 0.0        # EWMA of response time, seconds
+    failures: int = 0           # consecutive
+    open_until: float = 0.0
+    requests: int = 0
+    errors: int = 0
+    throttled: int = 0
+    short_circuited: int = 0
+    last_used: float = 0.0
+
+
+_lock = threading.Lock()
+_domains: Dict[str, DomainState] = {}
+
+
+def _domain(url: str) -> str:
+    return urlparse.urlsplit(url).netloc.lower()
+
+
+def _state(dom: str) -> DomainState:
+    st = _domains.get(dom)
+    if st is None:
+        st = _domains[dom] = DomainState()
+    return st
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After header (delta-seconds or HTTP date) -> seconds, capped."""
+    if not value:
+        return None
+    try:
+        secs = float(value)
+    except ValueError:
+        try:
+            secs = parsedate_to_datetime(value).timestamp() - time.time()
+        except Exception:
+            return None
+    return max(0.0, min(secs, MAX_RETRY_AFTER_S))
+
+
+def acquire(url: str) -> None:
+    """Block until the domain's next slot; raise CircuitOpen if it is being skipped."""
+    dom = _domain(url)
+    with _lock:
+        st = _state(dom)
+        now = time.monotonic()
+        st.last_used = now
+        if st.open_until > now:
+            st.short_circuited += 1
+            raise CircuitOpen(dom)
+        # reserve a slot so concurrent callers queue up behind each other
+        slot = max(now, st.next_at)
+        st.next_at = slot + st.gap
+        st.requests += 1
+    wait = slot - now
+    if wait > 0:
+        time.sleep(wait)
+
+
+def record(url: str, latency: float, status: int | None = None,
+           retry_after: float | None = None, error: bool = False, final: bool = True) -> None:
+    """
+    Feed the outcome of one attempt back into the domain's gap and breaker.
+    Failed attempts that will be retried (final=False) only slow the domain
+    down; the breaker counts a request once, when the caller gives up on it.
+    """
+    dom = _domain(url)
+    failed = error or status == 429 or (status is not None and status >= 500)
+    with _lock:
+        st = _state(dom)
+        now = time.monotonic()
+        st.latency = latency if st.latency == 0 else 0.8 * st.latency + 0.2 * latency
+        base = min(MAX_GAP_S, max(MIN_GAP_S, st.latency * LATENCY_FACTOR))
+        if failed:
+            st.errors += 1
+            st.gap = min(MAX_GAP_S, max(base, st.gap * 2))
+            if status == 429:
+                st.throttled += 1
+            if retry_after is not None and retry_after > RETRY_AFTER_MAX_WAIT_S:
+                st.open_until = max(st.open_until, now + retry_after)
+            elif retry_after is not None:
+                st.next_at = max(st.next_at, now + retry_after)
+            if final:
+                st.failures += 1
+                if st.failures >= BREAKER_THRESHOLD:
+                    st.open_until = now + BREAKER_COOLDOWN_S
+        else:
+            st.failures = 0
+            st.open_until = 0.0
+            # decay back towards the latency-derived gap
+            st.gap = max(base, st.gap * 0.7)
+
+
+def is_open(url: str) -> bool:
+    """Whether the domain's breaker is currently open (acquire() would raise CircuitOpen)."""
+    with _lock:
+        st = _domains.get(_domain(url))
+        return bool(st and st.open_until > time.monotonic())
+
+
+def snapshot(since: float = 0.0) -> Dict[str, dict]:
+    """Per-domain health for domains used at or after `since` (time.monotonic())."""
+    now = time.monotonic()
+    out = {}
+    with _lock:
+        for dom, st in _domains.items():
+            if st.last_used < since:
+                continue
+            d = asdict(st)
+            d["gap"] = round(st.gap, 3)
+            d["latency"] = round(st.latency, 3)
+            d["open"] = st.open_until > now
+            for k in ("next_at", "open_until", "last_used"):
+                d.pop(k)
+            out[dom] = d
+    return out
@@ -0,0 +1,91 @@
+"""
+Cached config loading for files under data/.
+
+Parsed values are kept in memory and rebuilt only when one of their source
+files changes (mtime, inode or size). Files are stat()ed at most once per
+CONFIG_CHECK_SECONDS, so steady-state requests do no file I/O at all while
+edits still take effect live.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+from app import filters
+from app.config import DATA_DIR
+from app.util import load_lines
+
+FEEDS_PATH = DATA_DIR / "feeds.txt"
+INCLUDE_PATH = DATA_DIR / "include.txt"
+EXCLUDE_PATH = DATA_DIR / "exclude.txt"
+
+CHECK_INTERVAL_S = float(os.getenv("CONFIG_CHECK_SECONDS", "2"))
+
+_lock = threading.Lock()
+# key -> (stamps, value, checked_at)
+_cache: Dict[str, Tuple[tuple, Any, float]] = {}
+
+
+def _stamp(path: str) -> tuple | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+def load(key: str, paths: Sequence[str], build: Callable[[], Any]) -> Any:
+    """Return the cached value for key, rebuilding it if any of paths changed."""
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(key)
+        if hit and now - hit[2] < CHECK_INTERVAL_S:
+            return hit[1]
+    stamps = tuple(_stamp(str(p)) for p in paths)
+    with _lock:
+        hit = _cache.get(key)
+        if hit and hit[0] == stamps:
+            _cache[key] = (stamps, hit[1], now)
+            return hit[1]
+    value = build()
+    # re-stat after building: the loader may have (re)written the file itself
+    stamps = tuple(_stamp(str(p)) for p in paths)
+    with _lock:
+        _cache[key] = (stamps, value, now)
+    return value
+
+
+def invalidate(key: str | None = None) -> None:
+    """Drop one cached entry (or all of them), e.g. right after a write."""
+    with _lock:
+        if key is None:
+            _cache.clear()
+        else:
+            _cache.pop(key, None)
+
+
+def version(key: str) -> tuple | None:
+    """File stamps the cached value was built from (None if not loaded yet)."""
+    with _lock:
+        hit = _cache.get(key)
+    return hit[0] if hit else None
+
+
+def lines(path) -> list[str]:
+    """Cached app.util.load_lines()."""
+    path = str(path)
+    return load(f"lines:{path}", [path], lambda: load_lines(path))
+
+
+def feeds() -> list[str]:
+    return lines(FEEDS_PATH)
+
+
+def filter_rules():
+    """Compiled include/exclude rules, rebuilt when either file changes."""
+    return load(
+        "filter_rules",
+        [str(INCLUDE_PATH), str(EXCLUDE_PATH)],
+        lambda: filters.compile_rules(load_lines(str(INCLUDE_PATH)), load_lines(str(EXCLUDE_PATH))),
+    )
@@ -0,0 +1,69 @@
+"""
+Retention and compaction for the SQLite cache.
+
+Summaries older than RETENTION_DAYS move to a separate archive DB
+(ARCHIVE_DB_PATH; searchable with /items?archive=1), leaving a url/hash stub
+so they are not summarized again. Run history older than RUNS_RETENTION_DAYS
+is pruned, stored article images are revalidated (evicted thumbnails and
+placeholders re-fetched, see app.images.revalidate), then free pages are
+released with an incremental VACUUM and the planner statistics refreshed
+with a sampled ANALYZE. maybe_run() does all of
+this at most once per MAINTENANCE_INTERVAL_HOURS; it is called after ingest
+runs and from the scheduler.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+from app import db, images
+from app.logging import setup
+
+log = setup()
+
+RETENTION_DAYS = float(os.getenv("RETENTION_DAYS", "90"))            # 0 = keep everything hot
+RUNS_RETENTION_DAYS = float(os.getenv("RUNS_RETENTION_DAYS", "30"))  # 0 = keep all run history
+INTERVAL_S = float(os.getenv("MAINTENANCE_INTERVAL_HOURS", "24")) * 3600
+VACUUM_PAGES = int(os.getenv("VACUUM_PAGES", "2000"))
+
+_lock = threading.Lock()
+
+
+def _cutoff(days: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+def run() -> Dict[str, Any]:
+    """Archive, prune, revalidate images and compact now. Returns what was done."""
+    db.init_db()
+    t0 = time.monotonic()
+    out: Dict[str, Any] = {"archived": 0, "pruned": {}}
+    if RETENTION_DAYS > 0:
+        out["archived"] = db.archive_summaries(_cutoff(RETENTION_DAYS))
+    if RUNS_RETENTION_DAYS > 0:
+        out["pruned"] = db.prune_runs(_cutoff(RUNS_RETENTION_DAYS))
+    out["images"] = images.revalidate()
+    out.update(db.compact(VACUUM_PAGES))
+    out["seconds"] = round(time.monotonic() - t0, 3)
+    db.meta_set("last_maintenance", str(time.time()))
+    log.info("maintenance: %s", out)
+    return out
+
+
+def maybe_run() -> Dict[str, Any] | None:
+    """run() if the last maintenance is older than the interval; None otherwise."""
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        db.init_db()
+        last = float(db.meta_get("last_maintenance") or 0)
+        if time.time() - last < INTERVAL_S:
+            return None
+        return run()
+    except Exception:
+        log.exception("maintenance failed")
+        return None
+    finally:
+        _lock.release()
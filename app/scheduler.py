@@ -0,0 +1,140 @@
+"""
+In-process scheduler for incremental ingest (enable with SCHEDULER_ENABLED=1).
+
+Every feed gets its own poll interval, learned from how often it publishes
+(median gap between entry timestamps) and whether recent polls found
+anything new, and persisted in the feed_state table. New feeds start at a
+random offset within their interval, and each tick polls at most
+SCHEDULER_BATCH overdue feeds, so polls are spread out instead of bursting.
+"""
+from __future__ import annotations
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List
+
+from app import db, pipeline, registry, retention
+from app.logging import setup
+from app.settings import load_settings
+
+log = setup()
+
+ENABLED = os.getenv("SCHEDULER_ENABLED", "0") == "1"
+TICK_S = float(os.getenv("SCHEDULER_TICK_SECONDS", "30"))
+BATCH = int(os.getenv("SCHEDULER_BATCH", "3"))
+MIN_INTERVAL_S = float(os.getenv("SCHEDULER_MIN_INTERVAL_MINUTES", "15")) * 60
+MAX_INTERVAL_S = float(os.getenv("SCHEDULER_MAX_INTERVAL_HOURS", "12")) * 3600
+DEFAULT_INTERVAL_S = 3600.0
+IDLE_BACKOFF = 1.5   # interval multiplier after a poll with nothing new
+JITTER = 0.1         # +/- fraction applied to every next_poll_at
+
+_stop = threading.Event()
+_thread: threading.Thread | None = None
+
+
+def _clamp(v: float) -> float:
+    return max(MIN_INTERVAL_S, min(MAX_INTERVAL_S, v))
+
+
+def next_interval(state: Dict[str, Any], feed_stats: Dict[str, Any]) -> float:
+    """
+    New poll interval for a feed after one poll.
+    Target is half the feed's publish gap (so we usually catch an item within
+    half a period); idle polls back off, productive ones move to the target.
+    """
+    current = float(state.get("interval_s") or DEFAULT_INTERVAL_S)
+    gap = feed_stats.get("publish_interval_s")
+    if feed_stats.get("new", 0) > 0:
+        target = gap / 2 if gap else current / IDLE_BACKOFF
+        return _clamp(0.5 * current + 0.5 * target)
+    backed_off = current * IDLE_BACKOFF
+    if gap:
+        backed_off = min(backed_off, max(gap, current))
+    return _clamp(backed_off)
+
+
+def _jittered(interval: float) -> float:
+    return interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+def due_feeds(now: float, feeds: List[str], states: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Overdue feeds, most overdue first; unknown feeds are given a spread-out first slot."""
+    due = []
+    for url in feeds:
+        st = states.get(url)
+        if st is None:
+            st = {"feed_url": url, "interval_s": DEFAULT_INTERVAL_S,
+                  "next_poll_at": now + random.uniform(0, min(DEFAULT_INTERVAL_S, TICK_S * len(feeds)))}
+            db.save_feed_state(st)
+            states[url] = st
+        if st["next_poll_at"] <= now:
+            due.append(url)
+    due.sort(key=lambda u: states[u]["next_poll_at"])
+    return due
+
+
+def tick() -> Dict[str, Any] | None:
+    """Poll up to BATCH overdue feeds once. Returns the run stats, or None if nothing ran."""
+    feeds = registry.feeds()
+    if not feeds:
+        return None
+    db.init_db()
+    now = time.time()
+    states = db.feed_states()
+    batch = due_feeds(now, feeds, states)[:BATCH]
+    if not batch:
+        return None
+    if not pipeline.RUN_LOCK.acquire(blocking=False):
+        return None  # a manual refresh is running; try again next tick
+    try:
+        stats = pipeline.run_once(feeds=batch, per_feed=load_settings().per_feed_cap)
+    finally:
+        pipeline.RUN_LOCK.release()
+
+    done = time.time()
+    for url in batch:
+        st = states[url]
+        fs = stats.get("feeds", {}).get(url, {})
+        interval = next_interval(st, fs)
+        db.save_feed_state({
+            "feed_url": url,
+            "interval_s": interval,
+            "next_poll_at": done + _jittered(interval),
+            "last_polled_at": done,
+            "last_new_at": done if fs.get("new") else st.get("last_new_at"),
+            "polls": int(st.get("polls") or 0) + 1,
+            "new_items": int(st.get("new_items") or 0) + int(fs.get("new", 0)),
+        })
+        log.info("scheduled poll %s: %d new, next in %.0f min", url, fs.get("new", 0), interval / 60)
+    return stats
+
+
+def _loop() -> None:
+    log.info("scheduler started (tick %.0fs, batch %d)", TICK_S, BATCH)
+    while not _stop.is_set():
+        try:
+            tick()
+            if pipeline.RUN_LOCK.acquire(blocking=False):
+                try:
+                    retention.maybe_run()
+                finally:
+                    pipeline.RUN_LOCK.release()
+        except Exception:
+            log.exception("scheduler tick failed")
+        _stop.wait(TICK_S)
+
+
+def start() -> None:
+    global _thread
+    if _thread and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="scheduler", daemon=True)
+    _thread.start()
+
+
+def stop() -> None:
+    _stop.set()
+    if _thread:
+        _thread.join(timeout=5)
@@ -1,7 +1,8 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, replace
 from pathlib import Path
 import json
 from app.config import DATA_DIR
+from app import registry
 
 SETTINGS_PATH = DATA_DIR / "settings.json"
 
@@ -12,21 +13,32 @@ class ServerSettings:
     per_domain_quota: int = 2
     recency_half_life_hours: int = 24
 
-def load_settings() -> ServerSettings:
+def _read_settings() -> ServerSettings:
     if SETTINGS_PATH.exists():
         try:
             data = json.loads(SETTINGS_PATH.read_text("utf-8"))
-            home_count = int(data.get("home_count", 5))
-            return ServerSettings(home_count=home_count)
+            d = ServerSettings()
+            return ServerSettings(
+                home_count=int(data.get("home_count", d.home_count)),
+                # an upper bound only: refreshes stop at each feed's watermark
+                per_feed_cap=max(1, min(int(data.get("per_feed_cap", d.per_feed_cap)), 200)),
+                per_domain_quota=int(data.get("per_domain_quota", d.per_domain_quota)),
+                recency_half_life_hours=int(data.get("recency_half_life_hours", d.recency_half_life_hours)),
+            )
         except Exception:
             pass
     s = ServerSettings()
     SETTINGS_PATH.write_text(json.dumps(asdict(s), ensure_ascii=False, indent=2), "utf-8")
     return s
 
+def load_settings() -> ServerSettings:
+    """Cached; re-read only when settings.json changes on disk."""
+    return registry.load("settings", [SETTINGS_PATH], _read_settings)
+
 def save_settings(new_data: dict) -> ServerSettings:
     home_count = int(new_data.get("home_count", 5))
     home_count = max(1, min(home_count, 20))
-    s = ServerSettings(home_count=home_count)
+    s = replace(load_settings(), home_count=home_count)
     SETTINGS_PATH.write_text(json.dumps(asdict(s), ensure_ascii=False, indent=2), "utf-8")
+    registry.invalidate("settings")
     return s
@@ -0,0 +1,107 @@
+"""
+Persisted TTL cache for per-site metadata (robots.txt rules, site names).
+
+Entries live in the SQLite `site_cache` table so a restart does not re-fetch
+robots.txt for every origin. A small in-process LRU sits in front of it.
+Failed lookups are cached too (for a shorter TTL), and expired entries are
+served stale while a background thread refreshes them.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Tuple
+
+from app import db
+from app.logging import setup
+
+log = setup()
+
+TTL_S = float(os.getenv("SITE_CACHE_TTL_HOURS", "24")) * 3600
+NEGATIVE_TTL_S = float(os.getenv("SITE_CACHE_NEGATIVE_TTL_MINUTES", "60")) * 60
+MAX_ENTRIES = int(os.getenv("SITE_CACHE_MAX_ENTRIES", "5000"))
+MEM_ENTRIES = 512
+
+_lock = threading.Lock()
+# key -> (parsed value, ok, expires_at)
+_mem: "OrderedDict[str, Tuple[Any, bool, float]]" = OrderedDict()
+_refreshing: set[str] = set()
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sitecache")
+
+
+def _remember(key: str, parsed: Any, ok: bool, expires_at: float) -> None:
+    with _lock:
+        _mem[key] = (parsed, ok, expires_at)
+        _mem.move_to_end(key)
+        while len(_mem) > MEM_ENTRIES:
+            _mem.popitem(last=False)
+
+
+def _fill(key: str, loader: Callable[[], str | None]) -> Tuple[str, bool, float]:
+    """Run loader and persist its result; None or an exception is a negative entry."""
+    now = time.time()
+    try:
+        value = loader()
+    except Exception as e:
+        log.debug("site cache miss for %s: %s", key, type(e).__name__)
+        value = None
+    ok = value is not None
+    expires_at = now + (TTL_S if ok else NEGATIVE_TTL_S)
+    value = value if ok else ""
+    try:
+        db.cache_put(key, value, ok, now, expires_at, MAX_ENTRIES)
+    except Exception as e:
+        log.warning("site cache write failed for %s: %s", key, e)
+    return value, ok, expires_at
+
+
+def _refresh(key: str, loader: Callable[[], str | None], parse: Callable[[str, bool], Any]) -> None:
+    try:
+        value, ok, expires_at = _fill(key, loader)
+        _remember(key, parse(value, ok), ok, expires_at)
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+
+def get(key: str, loader: Callable[[], str | None], parse: Callable[[str, bool], Any] = lambda v, ok: v) -> Any:
+    """
+    Return parse(value, ok) for key, loading it with loader() on a cold miss.
+    Stale entries are returned immediately and refreshed asynchronously.
+    """
+    now = time.time()
+    with _lock:
+        hit = _mem.get(key)
+        if hit:
+            _mem.move_to_end(key)
+    if hit and hit[2] > now:
+        return hit[0]
+
+    if not hit:
+        try:
+            row = db.cache_get(key)
+        except Exception as e:
+            log.warning("site cache read failed for %s: %s", key, e)
+            row = None
+        if row:
+            parsed = parse(row["value"], bool(row["ok"]))
+            _remember(key, parsed, bool(row["ok"]), row["expires_at"])
+            hit = (parsed, bool(row["ok"]), row["expires_at"])
+            if hit[2] > now:
+                return parsed
+
+    if hit:
+        # stale: serve what we have, refresh in the background
+        with _lock:
+            schedule = key not in _refreshing
+            _refreshing.add(key)
+        if schedule:
+            _pool.submit(_refresh, key, loader, parse)
+        return hit[0]
+
+    value, ok, expires_at = _fill(key, loader)
+    parsed = parse(value, ok)
+    _remember(key, parsed, ok, expires_at)
+    return parsed
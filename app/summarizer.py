@@ -1,12 +1,47 @@
-import json, re, time
+import json, os, re, time
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
-from openai import APIStatusError, APIConnectionError, RateLimitError
+from openai import APIStatusError, APIConnectionError, RateLimitError, BadRequestError
 from app.config import settings
 from app.logging import setup
+from app import condense, metrics
 
 log = setup()
 client = OpenAI(api_key=settings.openai_api_key)
 
+# articles whose cleaned text is at least this many tokens are summarized map-reduce style (0 = never)
+MAP_REDUCE_MIN_TOKENS = int(os.getenv("MAP_REDUCE_MIN_TOKENS", "8000"))
+MAP_CHUNK_TOKENS = int(os.getenv("MAP_CHUNK_TOKENS", "2500"))
+MAP_MAX_CHUNKS = int(os.getenv("MAP_MAX_CHUNKS", "4"))
+MAP_NOTE_TOKENS = 200
+# ask for a JSON-schema constrained response (falls back to free-text JSON if the model rejects it)
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "1") == "1"
+REPAIR_MAX_TOKENS = 600
+
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "url": {"type": "string"},
+        "title": {"type": "string"},
+        "summary": {"type": "string"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["url", "title", "summary", "tags"],
+    "additionalProperties": False,
+}
+MIN_SUMMARY_CHARS = 40
+
+_structured = STRUCTURED_OUTPUT
+
+
+class SummaryError(Exception):
+    """The model answered, but not with a usable summary; `kind` goes into the ingest stats."""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(message)
+        self.kind = kind
+        self.usage: dict = {}  # tokens spent before giving up, filled in by summarize_article
+
 SYSTEM_PROMPT = (
     "You write concise, factual abstracts of news and feature articles. "
     "Produce one coherent paragraph of about 200 words that summarizes the article itself, "
@@ -17,6 +52,17 @@ SYSTEM_PROMPT = (
     "Do not add commentary, opinion, or phrasing not supported by the source."
 )
 
+MAP_PROMPT = (
+    "You take notes on one part of a long article for a later summary. "
+    "List the concrete facts, figures, names, events and conclusions in this part as terse bullet points, "
+    "at most 120 words. No commentary."
+)
+
+REPAIR_PROMPT = (
+    "You fix malformed JSON. Return the same content as one valid JSON object with keys "
+    "url, title, summary, tags[]. Do not change the wording of the summary."
+)
+
 def _parse_json_safe(s: str) -> dict:
     try:
         return json.loads(s)
@@ -26,43 +72,228 @@ def _parse_json_safe(s: str) -> dict:
             raise
         return json.loads(m.group(0))
 
-def summarize_article(url: str, title: str, text: str) -> dict:
-    capped = (text or "")[:settings.input_char_cap]
+def _close_truncated(s: str) -> str:
+    """Close the string/arrays/objects left open by output cut off at max_output_tokens."""
+    stack, in_str, esc = [], False, False
+    for ch in s:
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if esc:
+        s = s[:-1]
+    s = s + ('"' if in_str else "")
+    s = re.sub(r",\s*$", "", s)
+    return s + "".join(reversed(stack))
+
+def _repair_json(raw: str, truncated: bool) -> dict | None:
+    """Local repairs: code fences, leading/trailing prose, trailing commas, truncation."""
+    s = re.sub(r"^```(?:json)?\s*|\s*```\s*$", "", raw.strip())
+    start = s.find("{")
+    if start < 0:
+        return None
+    s = s[start:]
+    if truncated:
+        s = _close_truncated(s)
+    else:
+        s = s[:s.rfind("}") + 1]
+    s = re.sub(r",\s*([}\]])", r"\1", s)
+    try:
+        data = json.loads(s)
+    except json.JSONDecodeError:
+        return None
+    if truncated and isinstance(data, dict) and isinstance(data.get("summary"), str):
+        # drop the sentence that was cut off
+        summary = data["summary"]
+        end = max(summary.rfind(". "), summary.rfind("! "), summary.rfind("? "))
+        if summary and summary[-1] not in ".!?" and end > 0:
+            data["summary"] = summary[:end + 1]
+    return data
+
+def _validate(data, url: str, title: str) -> tuple[dict | None, str]:
+    """Schema check with light coercion. Returns (data, "") or (None, problem)."""
+    if not isinstance(data, dict):
+        return None, "not an object"
+    summary = data.get("summary")
+    if not isinstance(summary, str) or len(summary.strip()) < MIN_SUMMARY_CHARS:
+        return None, "missing or empty summary"
+    tags = data.get("tags") or []
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",")]
+    if not isinstance(tags, list):
+        return None, "tags is not a list"
+    return {
+        **data,
+        "url": data.get("url") if isinstance(data.get("url"), str) and data.get("url") else url,
+        "title": data.get("title") if isinstance(data.get("title"), str) and data.get("title") else title,
+        "summary": summary,
+        "tags": [str(t).strip() for t in tags if isinstance(t, (str, int, float)) and str(t).strip()],
+    }, ""
 
-    backoff = 0.5
-    for attempt in range(1, 4):
+def _refusal(resp) -> str | None:
+    for item in getattr(resp, "output", None) or []:
+        for part in getattr(item, "content", None) or []:
+            if getattr(part, "type", "") == "refusal":
+                return getattr(part, "refusal", "") or "refused"
+    return None
+
+def _format_rejected(e: BadRequestError) -> bool:
+    """Whether a 400 is about the requested response format rather than the rest of the request."""
+    where = f"{getattr(e, 'param', None) or ''} {json.dumps(e.body, default=str) if e.body else e.message}"
+    return "text.format" in where or "response_format" in where
+
+def _create(system: str, text: str, max_output_tokens: int, url: str, schema: dict | None = None):
+    """
+    One Responses API call, retried with backoff on connection errors, 429s and 5xx.
+    With `schema` the output is constrained to it (structured outputs).
+    """
+    global _structured
+    kwargs = {}
+    if schema is not None and _structured:
+        kwargs["text"] = {"format": {"type": "json_schema", "name": "article_summary",
+                                     "schema": schema, "strict": True}}
+    backoff, attempt = 0.5, 0
+    while True:
+        attempt += 1
         try:
-            resp = client.responses.create(
+            return client.responses.create(
                 model=settings.openai_model,
                 input=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user",
-                     "content": [
-                         {"type": "input_text",
-                          "text": (
-                              'Return JSON only:\n'
-                              '{"url": str, "title": str, "summary": str, "tags": [str,...]}\n'
-                              f"URL: {url}\nTITLE: {title}\n\nARTICLE:\n{capped}"
-                          )}
-                     ]},
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": [{"type": "input_text", "text": text}]},
                 ],
                 temperature=0,
-                max_output_tokens=max(360, settings.max_output_tokens),
+                max_output_tokens=max_output_tokens,
+                **kwargs,
             )
-            raw = resp.output_text.strip()
-            data = _parse_json_safe(raw)
-            break
+        except BadRequestError as e:
+            if "text" not in kwargs or not _format_rejected(e):
+                raise
+            # model/endpoint without structured outputs: stop asking for them in this process
+            log.warning("structured output rejected (%s); falling back to free-text JSON", e)
+            _structured = False
+            kwargs.pop("text")
+            attempt -= 1
         except (APIConnectionError, RateLimitError, APIStatusError) as e:
+            status = getattr(e, "status_code", None)
+            if status and 400 <= status < 500 and status != 429:
+                raise  # our request is wrong; retrying will not help
             log.warning("LLM error %s on attempt %d for %s", type(e).__name__, attempt, url)
+            if attempt == 3:
+                raise
             time.sleep(backoff)
             backoff *= 2
-        except Exception as e:
-            # unrecoverable parse or other error
-            raise
+
+def _decode(resp, url: str, title: str, usage: dict) -> tuple[dict, str]:
+    """
+    Validated summary dict from a response, repairing malformed JSON locally
+    or, failing that, with one small LLM call on the raw output (the article
+    is not sent again). Returns (data, repair) with repair "", "local" or "llm".
+    """
+    refusal = _refusal(resp)
+    if refusal:
+        raise SummaryError("llm_refusal", refusal[:200])
+    raw = (resp.output_text or "").strip()
+    truncated = getattr(resp, "status", "") == "incomplete"
+    parsed = True
+    try:
+        data, problem = _validate(json.loads(raw), url, title)
+    except json.JSONDecodeError as e:
+        parsed, data, problem = False, None, f"invalid JSON: {e}"
+    if data is not None:
+        return data, ""
+
+    data, problem2 = _validate(_repair_json(raw, truncated), url, title)
+    if data is not None:
+        log.info("repaired LLM output locally for %s (%s)", url, problem)
+        return data, "local"
+    if truncated or not raw:
+        raise SummaryError("llm_truncated" if truncated else "llm_empty", problem)
+    if parsed:
+        # well-formed but unusable (e.g. no summary); a JSON repair cannot fix that
+        raise SummaryError("llm_invalid", problem)
+
+    fixed = _create(REPAIR_PROMPT, f"Problem: {problem}\n\nJSON:\n{raw}", REPAIR_MAX_TOKENS, url,
+                    schema=SUMMARY_SCHEMA)
+    _add_usage(usage, fixed)
+    try:
+        data, problem2 = _validate(_parse_json_safe((fixed.output_text or "").strip()), url, title)
+    except json.JSONDecodeError as e:
+        data, problem2 = None, f"invalid JSON: {e}"
+    if data is None:
+        raise SummaryError("llm_invalid", f"{problem}; after repair: {problem2}")
+    log.info("repaired LLM output with a repair call for %s (%s)", url, problem)
+    return data, "llm"
+
+def _add_usage(total: dict, resp) -> None:
+    usage = getattr(resp, "usage", None)
+    total["input_tokens"] += getattr(usage, "input_tokens", 0) or 0
+    total["output_tokens"] += getattr(usage, "output_tokens", 0) or 0
+
+def _map_notes(url: str, title: str, text: str, usage: dict) -> tuple[str, int]:
+    """Map step: bullet notes per chunk (in parallel). Returns (notes, article tokens sent)."""
+    parts = [condense.prepare(chunk, MAP_CHUNK_TOKENS)[0]
+             for chunk in condense.chunks(text, MAP_CHUNK_TOKENS, MAP_MAX_CHUNKS)]
+
+    def note(i_part):
+        i, part = i_part
+        return _create(MAP_PROMPT, f"TITLE: {title}\nPART {i + 1} of {len(parts)}:\n{part}", MAP_NOTE_TOKENS, url)
+
+    with ThreadPoolExecutor(max_workers=len(parts)) as ex:
+        resps = list(ex.map(note, enumerate(parts)))
+    for r in resps:
+        _add_usage(usage, r)
+    notes = "\n\n".join(f"Part {i + 1}:\n{r.output_text.strip()}" for i, r in enumerate(resps))
+    return notes, sum(condense.count_tokens(p) for p in parts)
+
+@metrics.timed("summ_stage_seconds", stage="llm")
+def summarize_article(url: str, title: str, text: str) -> dict:
+    body, prep = condense.prepare(text, settings.input_token_budget)
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    mode = "selected" if prep["selected"] else "full"
+    sent_tokens = prep["sent_tokens"]
+    label = "ARTICLE"
+    if MAP_REDUCE_MIN_TOKENS and prep["clean_tokens"] >= MAP_REDUCE_MIN_TOKENS:
+        body, sent_tokens = _map_notes(url, title, text, usage)
+        sent_tokens += condense.count_tokens(body)  # the notes go into the reduce call
+        mode, label = "map_reduce", "NOTES ON THE ARTICLE, IN ORDER"
+
+    resp = _create(
+        SYSTEM_PROMPT,
+        'Return JSON only:\n'
+        '{"url": str, "title": str, "summary": str, "tags": [str,...]}\n'
+        f"URL: {url}\nTITLE: {title}\n\n{label}:\n{body}",
+        max(360, settings.max_output_tokens),
+        url,
+        schema=SUMMARY_SCHEMA,
+    )
+    _add_usage(usage, resp)
+    try:
+        data, repair = _decode(resp, url, title, usage)
+    except SummaryError as e:
+        e.usage = usage
+        raise
 
     # normalize
-    data.setdefault("url", url)
-    data.setdefault("title", title)
     data["summary"] = " ".join((data.get("summary") or "").split())
-    data["tags"] = list(data.get("tags", []))[:8]
+    data["tags"] = data["tags"][:8]
+    # token usage for the ingest trace; popped by the pipeline before storing.
+    # tokens_saved: article tokens that went into the prompts (chunks and notes for map-reduce)
+    # compared with the article as it used to be sent, cut at INPUT_CHAR_CAP. Both sides are
+    # counted the same way; prompts and schema cost the same either way and are left out.
+    data["_usage"] = {
+        **usage,
+        "mode": mode,
+        "tokens_saved": condense.count_tokens(text[:settings.input_char_cap]) - sent_tokens,
+        "repair": repair,
+    }
     return data
@@ -0,0 +1,83 @@
+"""
+Optional process pool for CPU-heavy parsing (trafilatura, lxml, feedparser).
+
+PARSE_WORKERS=0 (default) runs everything inline. With N > 0 the functions
+passed to run() execute in N spawned worker processes, so parsing from
+concurrent ingest threads is no longer serialized by the GIL. Arguments are
+pickled, so hand over raw bytes rather than decoded strings or parsed trees.
+"""
+from __future__ import annotations
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from app.logging import setup
+
+log = setup()
+
+_lock = threading.Lock()
+_workers = int(os.getenv("PARSE_WORKERS", "0"))
+_pool: ProcessPoolExecutor | None = None
+
+
+def configure(workers: int) -> None:
+    """Set the pool size (0 = inline); an existing pool is shut down."""
+    global _workers
+    shutdown()
+    with _lock:
+        _workers = max(0, int(workers))
+
+
+def worker_count() -> int:
+    return _workers
+
+
+def _get_pool() -> ProcessPoolExecutor | None:
+    global _pool
+    if _workers <= 0:
+        return None
+    with _lock:
+        if _pool is None:
+            # spawn: the parent has live threads (sitecache refresh, uvicorn), fork is unsafe
+            _pool = ProcessPoolExecutor(max_workers=_workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def submit(fn: Callable[..., Any], *args: Any) -> Future:
+    """Schedule fn(*args) on the pool; inline (already resolved) when disabled."""
+    pool = _get_pool()
+    if pool is not None:
+        return pool.submit(fn, *args)
+    fut: Future = Future()
+    try:
+        fut.set_result(fn(*args))
+    except Exception as e:
+        fut.set_exception(e)
+    return fut
+
+
+def run(fn: Callable[..., Any], *args: Any) -> Any:
+    """fn(*args) on the pool, falling back to inline if the pool broke."""
+    global _pool
+    try:
+        return submit(fn, *args).result()
+    except BrokenProcessPool:
+        log.warning("parse pool broken, recreating and running %s inline", getattr(fn, "__name__", fn))
+        with _lock:
+            _pool = None
+        return fn(*args)
+
+
+def shutdown() -> None:
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown)
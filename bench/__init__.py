@@ -0,0 +1 @@
+"""Benchmarks for the ingest path. Run modules with `python -m bench.<name>` from the repo root."""
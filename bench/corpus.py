@@ -0,0 +1,59 @@
+"""
+HTML fixture corpus for the benchmarks.
+
+Saved pages are read from a directory of *.html files (e.g. pages saved with
+`curl -o bench/fixtures/site.html <url>`). When the directory is missing or
+empty a deterministic synthetic corpus is generated instead, so benchmarks
+always have something to chew on.
+"""
+from __future__ import annotations
+import random
+from pathlib import Path
+from typing import List, Tuple
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+_WORDS = (
+    "model data research network energy climate market policy system city "
+    "study report science health court election budget water carbon chip "
+    "language training school history museum archive protein galaxy ocean"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    n = rng.randint(8, 22)
+    words = [rng.choice(_WORDS) for _ in range(n)]
+    if rng.random() < 0.3:
+        words.insert(rng.randint(0, n - 1), str(rng.randint(2, 2024)))
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_page(i: int, paragraphs: int = 30, seed: int = 0) -> str:
+    """One news-like page: noisy head, nav, article body, related links, footer."""
+    rng = random.Random(seed * 100003 + i)
+    head = "".join(f'<script src="/static/app{j}.js"></script>' for j in range(8))
+    head += "<style>" + ".c{color:red}" * 200 + "</style>"
+    nav = "<nav><ul>" + "".join(f'<li><a href="/s/{j}">Section {j}</a></li>' for j in range(40)) + "</ul></nav>"
+    body = "".join(
+        "<p>" + " ".join(_sentence(rng) for _ in range(rng.randint(3, 7))) + "</p>"
+        for _ in range(paragraphs)
+    )
+    related = "<aside>" + "".join(f'<a href="/a/{j}"><img src="/t/{j}.jpg">Related {j}</a>' for j in range(20)) + "</aside>"
+    footer = "<footer>" + "<p>Subscribe to our newsletter. Cookie settings. All rights reserved.</p>" * 5 + "</footer>"
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>Article {i} | Example News</title>"
+        "<meta property='og:site_name' content='Example News'>"
+        f"<meta property='og:image' content='/img/{i}.jpg'>"
+        f"{head}</head><body>{nav}<article><h1>Article {i}</h1>{body}</article>"
+        f"{related}{footer}</body></html>"
+    )
+
+
+def load(directory: Path | str | None = None, synthetic: int = 40) -> List[Tuple[str, bytes]]:
+    """[(name, html bytes)] from directory, or `synthetic` generated pages."""
+    d = Path(directory) if directory else FIXTURES_DIR
+    files = sorted(d.glob("*.html")) if d.is_dir() else []
+    if files:
+        return [(f.name, f.read_bytes()) for f in files]
+    return [(f"synthetic-{i}.html", synthetic_page(i).encode("utf-8")) for i in range(synthetic)]
@@ -0,0 +1,69 @@
+"""
+Extraction benchmark: legacy path vs. the bounded path in app.fetch.
+
+    python -m bench.extract [--corpus DIR] [--repeat 3]
+
+legacy  = full BeautifulSoup tree for the image + full trafilatura.extract
+bounded = streaming <head> scan + size-capped, fast-first trafilatura
+"""
+from __future__ import annotations
+import argparse
+import statistics
+import time
+
+import trafilatura
+from bs4 import BeautifulSoup
+
+from app import fetch
+from bench import corpus
+
+
+def legacy(html: bytes) -> tuple[str, str]:
+    text = html.decode("utf-8", "replace")
+    soup = BeautifulSoup(text, "html.parser")
+    tag = soup.find("meta", {"property": "og:image"}) or soup.find("meta", {"name": "twitter:image"})
+    img = tag.get("content") if tag else ""
+    out = trafilatura.extract(
+        text, include_comments=False, include_images=False,
+        include_tables=False, favor_precision=True,
+    ) or ""
+    return out, img
+
+
+def bounded(html: bytes) -> tuple[str, str]:
+    html = html[:fetch.MAX_HTML_BYTES]
+    return fetch.extract_text(html), fetch._image_from_html(html, "https://example.local/")
+
+
+def _run(fn, pages, repeat: int) -> list[float]:
+    per_page = []
+    for _ in range(repeat):
+        for _, html in pages:
+            t0 = time.perf_counter()
+            fn(html)
+            per_page.append((time.perf_counter() - t0) * 1000)
+    return per_page
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1].strip())
+    ap.add_argument("--corpus", default=None, help="Directory of saved *.html pages")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    pages = corpus.load(args.corpus)
+    total_kb = sum(len(h) for _, h in pages) / 1024
+    print(f"{len(pages)} pages, {total_kb:.0f} KiB")
+    for name, fn in (("legacy", legacy), ("bounded", bounded)):
+        fn(pages[0][1])  # warm-up
+        ms = _run(fn, pages, args.repeat)
+        q = statistics.quantiles(ms, n=20)
+        print(f"{name:8s} mean {statistics.mean(ms):7.2f} ms  p50 {statistics.median(ms):7.2f}  "
+              f"p95 {q[18]:7.2f}  total {sum(ms) / 1000:6.2f} s")
+    lt, li = legacy(pages[0][1])
+    bt, bi = bounded(pages[0][1])
+    print(f"sample: legacy {len(lt)} chars img={li!r} | bounded {len(bt)} chars img={bi!r}")
+
+
+if __name__ == "__main__":
+    main()
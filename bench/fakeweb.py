@@ -0,0 +1,203 @@
+"""
+Local stand-ins for the outside world, for benchmarks.
+
+FakeWeb starts one HTTP server per fake site (so per-domain rate limiting
+behaves as it would against real hosts). Each site serves /robots.txt, an RSS
+feed at /feed.xml and synthetic article pages, with configurable latency and
+error rate. FakeLLM answers POST /v1/responses like the OpenAI Responses API,
+so `OPENAI_BASE_URL=<FakeLLM.base_url>` points app.summarizer at it.
+"""
+from __future__ import annotations
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from bench import corpus
+
+
+class _Server:
+    def __init__(self, handler_cls):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler_cls)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeWeb:
+    def __init__(self, sites: int, entries: int, latency_ms: float = 20.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.entries = entries
+        self.latency_s = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._epoch = datetime.now(timezone.utc)  # feeds are stable, so ETags are too
+        self._servers = [_Server(self._handler(i)) for i in range(sites)]
+
+    @property
+    def feed_urls(self) -> List[str]:
+        return [f"{s.base_url}/feed.xml" for s in self._servers]
+
+    def total_requests(self) -> int:
+        with self._lock:
+            return sum(self.counts.values())
+
+    def close(self) -> None:
+        for s in self._servers:
+            s.close()
+
+    def _rss(self, base: str, site: int) -> bytes:
+        now = self._epoch
+        items = "".join(
+            f"<item><title>Site {site} story {j}</title><link>{base}/article/{j}</link>"
+            f"<guid>{base}/article/{j}</guid>"
+            f"<pubDate>{format_datetime(now - timedelta(hours=j))}</pubDate></item>"
+            for j in range(self.entries)
+        )
+        return (f'<?xml version="1.0"?><rss version="2.0"><channel><title>Fake Site {site}</title>'
+                f"<link>{base}/</link>{items}</channel></rss>").encode("utf-8")
+
+    def _handler(self, site: int):
+        web = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                kind = "robots" if self.path == "/robots.txt" else (
+                    "feed" if self.path.startswith("/feed") else "article")
+                with web._lock:
+                    web.counts[kind] += 1
+                    fail = kind == "article" and web._rng.random() < web.error_rate
+                if web.latency_s:
+                    time.sleep(web.latency_s)
+                base = f"http://127.0.0.1:{self.server.server_port}"
+                if fail:
+                    return self._send(500, b"boom", "text/plain")
+                if kind == "robots":
+                    return self._send(200, b"User-agent: *\nAllow: /\n", "text/plain")
+                if kind == "feed":
+                    etag = f'"feed-{site}-{web.entries}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        return self._send(304, b"", "application/rss+xml")
+                    return self._send(200, web._rss(base, site), "application/rss+xml", etag)
+                try:
+                    j = int(self.path.rsplit("/", 1)[-1])
+                except ValueError:
+                    return self._send(404, b"", "text/plain")
+                page = corpus.synthetic_page(site * 100000 + j, seed=site)
+                return self._send(200, page.encode("utf-8"), "text/html; charset=utf-8")
+
+            def _send(self, status: int, body: bytes, ctype: str, etag: str | None = None):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class FakeLLM:
+    """
+    Minimal OpenAI Responses API: returns a canned JSON summary after latency_ms.
+    A bad_json_rate fraction of summaries come back malformed (fenced with a
+    trailing comma, cut off at max_output_tokens, or with unquoted keys).
+    """
+
+    BAD_KINDS = ("fenced", "truncated", "unquoted")
+
+    def __init__(self, latency_ms: float = 300.0, bad_json_rate: float = 0.0, seed: int = 0):
+        self.latency_s = latency_ms / 1000.0
+        self.bad_json_rate = bad_json_rate
+        self.calls = 0
+        self.input_chars = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server(self._handler())
+
+    @property
+    def base_url(self) -> str:
+        return f"{self._server.base_url}/v1"
+
+    def close(self) -> None:
+        self._server.close()
+
+    def _handler(self):
+        llm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with llm._lock:
+                    llm.calls += 1
+                    llm.input_chars += len(body)
+                    bad = llm._rng.choice(llm.BAD_KINDS) if llm._rng.random() < llm.bad_json_rate else None
+                if llm.latency_s:
+                    time.sleep(llm.latency_s)
+                # echo URL/TITLE from the prompt like a well-behaved model would
+                prompt = body.decode("utf-8", "replace")
+                fields = dict(re.findall(r"(URL|TITLE): ([^\\]*)\\n", prompt))
+                summary = {"url": fields.get("URL", ""), "title": fields.get("TITLE", ""),
+                           "summary": "Synthetic summary. " * 20, "tags": ["bench"]}
+                text, status = json.dumps(summary), "completed"
+                if "fix malformed JSON" in prompt:
+                    pass  # repair call: always answer well-formed
+                elif bad == "fenced":
+                    text = f"Here you go:\n```json\n{text[:-1]},}}\n```"
+                elif bad == "truncated":
+                    text, status = text[:len(text) // 2], "incomplete"
+                elif bad == "unquoted":
+                    text = text.replace('"summary":', "summary:")
+                resp = {
+                    "id": f"resp_{llm.calls}",
+                    "object": "response",
+                    "created_at": int(time.time()),
+                    "model": "fake",
+                    "status": status,
+                    "incomplete_details": {"reason": "max_output_tokens"} if status == "incomplete" else None,
+                    "output": [{
+                        "type": "message", "id": f"msg_{llm.calls}", "status": "completed", "role": "assistant",
+                        "content": [{"type": "output_text", "text": text, "annotations": []}],
+                    }],
+                    "usage": {
+                        "input_tokens": len(body) // 4, "output_tokens": 200, "total_tokens": len(body) // 4 + 200,
+                        "input_tokens_details": {"cached_tokens": 0},
+                        "output_tokens_details": {"reasoning_tokens": 0},
+                    },
+                    "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+                }
+                out = json.dumps(resp).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,157 @@
+"""
+End-to-end ingest benchmark against a local fake web and fake LLM.
+
+    python -m bench.ingest --feeds 5 --entries 10 [--latency-ms 20] [--error-rate 0.05] [--bad-json-rate 0.1]
+                           [--llm-latency-ms 300] [--runs 2] [--json out.json]
+                           [--compare baseline.json --tolerance 0.2]
+
+Runs app.pipeline.run_once in a scratch DATA_DIR (nothing under data/ is
+touched) and reports articles/sec, per-stage latency percentiles, HTTP
+requests per article and peak memory. With --compare the process exits 1
+when articles/sec drops more than --tolerance below the baseline.
+"""
+from __future__ import annotations
+import argparse
+import functools
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+from bench.fakeweb import FakeLLM, FakeWeb
+
+_timings: dict[str, list[float]] = defaultdict(list)
+
+
+def _timed(stage: str, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _timings[stage].append((time.perf_counter() - t0) * 1000)
+    return wrapper
+
+
+def _instrument():
+    from app import db, fetch, pipeline
+    fetch.get_feed_entries = _timed("feed", fetch.get_feed_entries)
+    fetch.fetch_page_status = _timed("fetch_page", fetch.fetch_page_status)  # fetch_page() goes through it too
+    fetch.parse_page = _timed("parse_page", fetch.parse_page)
+    fetch.polite_delay = _timed("polite_delay", fetch.polite_delay)
+    pipeline.summarize_article = _timed("llm", pipeline.summarize_article)
+    db.insert_summary = _timed("db_insert", db.insert_summary)
+
+
+def _percentiles(ms: list[float]) -> dict:
+    if not ms:
+        return {}
+    q = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else [ms[0]] * 99
+    return {"n": len(ms), "p50": round(q[49], 2), "p95": round(q[94], 2),
+            "p99": round(q[98], 2), "max": round(max(ms), 2)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="End-to-end ingest benchmark")
+    ap.add_argument("--feeds", type=int, default=5, help="Number of fake sites/feeds")
+    ap.add_argument("--entries", type=int, default=10, help="Entries per feed")
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="Fake web response latency")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of article requests that 500")
+    ap.add_argument("--bad-json-rate", type=float, default=0.0, help="Fraction of LLM answers that are malformed")
+    ap.add_argument("--llm-latency-ms", type=float, default=300.0, help="Fake LLM latency")
+    ap.add_argument("--min-gap", type=float, default=None, help="Override RATE_MIN_GAP_SECONDS")
+    ap.add_argument("--parse-workers", type=int, default=0)
+    ap.add_argument("--runs", type=int, default=1, help="Repeat run_once (later runs are warm/cached)")
+    ap.add_argument("--json", default=None, help="Write the report here")
+    ap.add_argument("--compare", default=None, help="Baseline report to compare articles/sec against")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    args = ap.parse_args()
+
+    web = FakeWeb(args.feeds, args.entries, args.latency_ms, args.error_rate)
+    llm = FakeLLM(args.llm_latency_ms, args.bad_json_rate)
+    scratch = tempfile.mkdtemp(prefix="bench-ingest-")
+    # must be set before any app module is imported
+    os.environ["DATA_DIR"] = scratch
+    os.environ.pop("DB_PATH", None)
+    os.environ["OPENAI_BASE_URL"] = llm.base_url
+    os.environ["OPENAI_API_KEY"] = "bench"
+    if args.min_gap is not None:
+        os.environ["RATE_MIN_GAP_SECONDS"] = str(args.min_gap)
+
+    from app import pipeline, workers
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    workers.configure(args.parse_workers)
+    _instrument()
+
+    tracemalloc.start()
+    report = {"config": vars(args), "runs": []}
+    try:
+        for i in range(args.runs):
+            _timings.clear()
+            req0, llm0, chars0 = web.total_requests(), llm.calls, llm.input_chars
+            t0 = time.perf_counter()
+            stats = pipeline.run_once(feeds=web.feed_urls, per_feed=args.entries)
+            wall = time.perf_counter() - t0
+            processed = stats["summarized"] + stats["skipped"] + stats["errors"]
+            requests = web.total_requests() - req0
+            report["runs"].append({
+                "run": i + 1,
+                "wall_s": round(wall, 3),
+                "seen": stats["seen"],
+                "summarized": stats["summarized"],
+                "cached": stats["cached"],
+                "errors": stats["errors"],
+                "retry": stats["retry"],
+                "articles_per_s": round(stats["summarized"] / wall, 3) if wall else 0.0,
+                "http_requests": requests,
+                "requests_per_article": round(requests / processed, 2) if processed else None,
+                "llm_calls": llm.calls - llm0,
+                "llm_input_chars": llm.input_chars - chars0,
+                "tokens_saved": stats.get("tokens_saved", 0),
+                "repaired": stats.get("repaired", 0),
+                "error_kinds": stats.get("error_kinds", {}),
+                "stages_ms": {k: _percentiles(v) for k, v in sorted(_timings.items())},
+            })
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        workers.shutdown()
+        web.close()
+        llm.close()
+    report["peak_traced_mb"] = round(peak / 2**20, 1)
+    report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    for r in report["runs"]:
+        print(f"run {r['run']}: {r['summarized']} summarized / {r['seen']} seen in {r['wall_s']}s "
+              f"-> {r['articles_per_s']} articles/s, {r['http_requests']} HTTP requests "
+              f"({r['requests_per_article']}/article), {r['llm_calls']} LLM calls "
+              f"({r['llm_input_chars']} input chars, {r['tokens_saved']} tokens saved), "
+              f"{r['repaired']} repaired, errors {r['error_kinds'] or 'none'}")
+        for stage, p in r["stages_ms"].items():
+            print(f"   {stage:12s} n={p['n']:<5d} p50 {p['p50']:8.2f}  p95 {p['p95']:8.2f}  "
+                  f"p99 {p['p99']:8.2f}  max {p['max']:8.2f} ms")
+    print(f"peak traced memory {report['peak_traced_mb']} MiB, max RSS {report['max_rss_mb']} MiB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        old = base["runs"][0]["articles_per_s"]
+        new = report["runs"][0]["articles_per_s"]
+        if old and new < old * (1 - args.tolerance):
+            print(f"REGRESSION: {new} articles/s vs baseline {old}")
+            sys.exit(1)
+        print(f"ok: {new} articles/s vs baseline {old}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Parse-pool scaling benchmark over the fixture corpus.
+
+    python -m bench.parse_pool [--corpus DIR] [--repeat 3] [--workers 0,1,2,4]
+
+Eight threads submit app.fetch page parses concurrently (as a concurrent
+ingest would); throughput is reported per PARSE_WORKERS setting.
+"""
+from __future__ import annotations
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import fetch, workers
+from bench import corpus
+
+
+def _bench(pages, repeat: int, n_workers: int) -> float:
+    workers.configure(n_workers)
+    # warm the pool so process start-up is not measured
+    list(ThreadPoolExecutor(max(1, n_workers)).map(
+        lambda p: fetch.parse_page("https://example.local/", p[1]), pages[:max(1, n_workers)]))
+    jobs = pages * repeat
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        list(ex.map(lambda p: fetch.parse_page("https://example.local/", p[1]), jobs))
+    return len(jobs) / (time.perf_counter() - t0)
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default = ",".join(str(n) for n in sorted({0, 1, 2, 4, cpus}) if n <= cpus)
+    ap = argparse.ArgumentParser(description="Parse-pool scaling benchmark")
+    ap.add_argument("--corpus", default=None, help="Directory of saved *.html pages")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--workers", default=default, help="Comma-separated PARSE_WORKERS values")
+    args = ap.parse_args()
+
+    pages = corpus.load(args.corpus)
+    print(f"{len(pages)} pages x {args.repeat}, {cpus} CPUs")
+    base = None
+    for n in [int(x) for x in args.workers.split(",")]:
+        rate = _bench(pages, args.repeat, n)
+        base = base or rate
+        label = "inline" if n == 0 else f"{n} proc"
+        print(f"{label:8s} {rate:8.1f} pages/s  x{rate / base:4.2f}")
+    workers.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import argparse
 import os
 from typing import List
 from app.pipeline import run_once
+from app import workers, backfill, images, retention
+from app.settings import load_settings
 
 from app.logging import setup
 log = setup()
@@ -9,6 +11,7 @@ log = setup()
 DEF_FEEDS = "data/feeds.txt"
 DEF_INCLUDE = "data/include.txt"
 DEF_EXCLUDE = "data/exclude.txt"
+DEF_BULK_PER_FEED = 25  # --backfill / --ignore-watermark
 
 def load_lines(path: str) -> List[str]:
     if not path or not os.path.exists(path):
@@ -23,9 +26,47 @@ def main():
     ap.add_argument("--feeds", default=DEF_FEEDS, help="Path to feeds list")
     ap.add_argument("--include", default=DEF_INCLUDE, help="Path to include keywords list")
     ap.add_argument("--exclude", default=DEF_EXCLUDE, help="Path to exclude keywords list")
-    ap.add_argument("--per-feed", type=int, default=5, help="Max items per feed")
+    ap.add_argument("--per-feed", type=int, default=None,
+                    help="Max items per feed (default: per_feed_cap from settings, like /refresh; "
+                         f"{DEF_BULK_PER_FEED} with --backfill/--ignore-watermark)")
+    ap.add_argument("--ignore-watermark", action="store_true",
+                    help="Re-examine the first --per-feed entries of every feed")
+    ap.add_argument("--backfill", action="store_true",
+                    help="Start a resumable backfill job (persisted queue, checkpointed progress)")
+    ap.add_argument("--resume", nargs="?", type=int, const=-1, default=None, metavar="JOB_ID",
+                    help="Resume a backfill job (default: the latest unfinished one)")
+    ap.add_argument("--validate-images", action="store_true",
+                    help="Re-check stored article images (re-cache or swap in the placeholder) and exit")
+    ap.add_argument("--maintain", action="store_true",
+                    help="Archive old summaries, prune run history, vacuum/analyze now, and exit")
+    ap.add_argument("--concurrency", type=int, default=backfill.CONCURRENCY,
+                    help="Backfill worker threads")
+    ap.add_argument("--batch-size", type=int, default=backfill.BATCH_SIZE,
+                    help="Backfill entries per checkpoint/commit")
     ap.add_argument("--dry-run", action="store_true", help="Do everything except call the LLM and write")
+    ap.add_argument("--parse-workers", type=int, default=None,
+                    help="Processes for HTML/feed parsing (0 = inline; default: PARSE_WORKERS env)")
     args = ap.parse_args()
+    if args.per_feed is None:
+        args.per_feed = DEF_BULK_PER_FEED if args.backfill or args.ignore_watermark else load_settings().per_feed_cap
+    if args.parse_workers is not None:
+        workers.configure(args.parse_workers)
+
+    if args.validate_images:
+        log.info("Image validation %s", images.revalidate())
+        return
+
+    if args.maintain:
+        retention.run()
+        return
+
+    if args.resume is not None:
+        job_id = args.resume if args.resume > 0 else backfill.latest_unfinished()
+        if job_id is None:
+            raise SystemExit("No unfinished backfill job to resume.")
+        stats = backfill.run_job(job_id, args.concurrency, args.batch_size)
+        log.info("Backfill job %d done %s", job_id, stats)
+        return
 
     feeds = load_lines(args.feeds)
     inc = load_lines(args.include)
@@ -33,15 +74,24 @@ def main():
     if not feeds:
         raise SystemExit(f"No feeds found at {args.feeds}. Add URLs, one per line.")
 
+    if args.backfill:
+        job_id = backfill.create_job(feeds, args.per_feed, args.dry_run)
+        stats = backfill.run_job(job_id, args.concurrency, args.batch_size)
+        log.info("Backfill job %d done %s", job_id, stats)
+        return
+
     stats = run_once(
         feeds=feeds,
         includes=inc,
         excludes=exc,
         per_feed=args.per_feed,
         dry_run=args.dry_run,
+        use_watermark=not args.ignore_watermark,
     )
 
     log.info("Done %s", stats)
+    if not args.dry_run:
+        retention.maybe_run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,38 @@
+import argparse
+from app.db import init_db, slow_domains, expensive_articles, llm_outcomes
+
+def _table(rows, cols):
+    if not rows:
+        print("  (no data)")
+        return
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in cols}
+    print("  " + "  ".join(c.ljust(widths[c]) for c in cols))
+    for r in rows:
+        print("  " + "  ".join(str(r.get(c, "")).ljust(widths[c]) for c in cols))
+
+def main():
+    ap = argparse.ArgumentParser(description="Slowest domains, most expensive articles and LLM outcomes over recent runs.")
+    ap.add_argument("--runs", type=int, default=10, help="Look at the last N runs")
+    ap.add_argument("--limit", type=int, default=20, help="Rows per table")
+    args = ap.parse_args()
+
+    init_db()
+    print(f"Slowest domains (last {args.runs} runs)")
+    _table(slow_domains(args.runs, args.limit),
+           ["domain", "articles", "errors", "skipped", "retry", "avg_fetch_ms", "avg_extract_ms",
+            "avg_llm_ms", "avg_total_ms", "prompt_tokens", "output_tokens", "tokens_saved"])
+    print()
+    print(f"Most expensive articles (last {args.runs} runs)")
+    _table(expensive_articles(args.runs, args.limit),
+           ["prompt_tokens", "output_tokens", "tokens_saved", "llm_ms", "fetch_ms", "bytes_fetched", "outcome", "url"])
+    print()
+    print(f"LLM outcomes (last {args.runs} runs)")
+    outcomes = llm_outcomes(args.runs)
+    _table(outcomes, ["result", "articles", "prompt_tokens", "output_tokens"])
+    stored = sum(r["articles"] for r in outcomes if r["result"].startswith("stored"))
+    spent = sum((r["prompt_tokens"] or 0) + (r["output_tokens"] or 0) for r in outcomes)
+    if stored:
+        print(f"  {spent / stored:.0f} LLM tokens per stored summary (failures included)")
+
+if __name__ == "__main__":
+    main()